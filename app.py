@@ -1,22 +1,48 @@
 import os
 import logging
+import click
 import numpy as np
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, stream_with_context
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from datetime import datetime, timedelta
 import re
-
-from extensions import db
-from models import User, Expense, Budget, Category, FinancialGoal # Added FinancialGoal import
+import json
+import threading
+import time
+from functools import partial
+from sqlalchemy.orm import joinedload
+
+from extensions import db, replica_reads, REPLICA_BIND_KEY
+from models import User, Expense, Budget, Category, FinancialGoal, RecurringCharge
 from services.ai_service import (
     analyze_spending_patterns, 
     generate_saving_tip,
-    simulate_financial_scenario,
-    analyze_expense_cause,
     categorize_transaction
 )
 from services.voice_service import voice_assistant
+from services.intent_router import router as intent_router
+from services.single_flight import llm_requests
+from services.admission import UnlimitedStore, admission_stats, ai_admission, configure_store
+from services.expense_archive import archive_expenses, category_totals, ensure_archive_schema
+from services.expense_export import EXPORT_FORMATS, ExportFormatError, stream_expenses
+from services.expense_search import ensure_search_index, search_expenses
+from services.template_cache import init_template_caching
+from services.profiler import (
+    PROFILE_FORMATS,
+    StackSampler,
+    init_profiling,
+    render_profile,
+    time_breakdown,
+    top_functions
+)
+from services.synthetic_data import SYNTHETIC_PASSWORD, seed_synthetic_data
+from services.sync import SyncError, changes_since, ensure_sync_schema, upload_expenses
+from services.anomaly_detector import backfill_spending_state, record_expense
+from services.recurring_charges import (
+    detect_recurring_charges,
+    update_recurring_for_expense
+)
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -31,14 +57,35 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
 }
+if not (app.config["SQLALCHEMY_DATABASE_URI"] or "").startswith("sqlite"):
+    # Threaded/gevent workers hold a connection per in-flight request while it waits on a provider.
+    # Each worker process has its own pool (and another for the replica), so the database sees up to
+    # workers x (pool_size + max_overflow); gunicorn.conf.py sizes the pool to its thread count.
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"].update({
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 10)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 30)),
+    })
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+if os.environ.get("DATABASE_REPLICA_URL"):
+    # Analytical reads wrapped in replica_reads() go here; writes always hit the primary
+    app.config["SQLALCHEMY_BINDS"] = {REPLICA_BIND_KEY: os.environ["DATABASE_REPLICA_URL"]}
+    app.config["SQLALCHEMY_REPLICA_LAG_SECONDS"] = float(os.environ.get("DATABASE_REPLICA_LAG_SECONDS", 5))
 db.init_app(app)
+init_template_caching(app)
+
+# Comma-separated emails allowed to export every user's data
+app.config["ADMIN_EMAILS"] = {
+    email.strip().lower() for email in os.environ.get("ADMIN_EMAILS", "").split(",") if email.strip()
+}
 
 # Initialize Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# Sampled profiling for PROFILE_ENDPOINTS, or per request with "X-Profile: 1" from an admin
+init_profiling(app, authorize=lambda: is_admin(current_user))
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -47,6 +94,9 @@ def load_user(user_id):
 with app.app_context():
     # Create all database tables
     db.create_all()
+    ensure_sync_schema()
+    ensure_archive_schema()
+    ensure_search_index()
 
     # Create default categories with recommended student budget amounts
     default_categories = [
@@ -86,25 +136,36 @@ def index():
 
 @app.route('/dashboard')
 @login_required
+@ai_admission('dashboard')
+@replica_reads()
 def dashboard():
-    # Get recent expenses and budgets
-    expenses = Expense.query.filter_by(user_id=current_user.id).order_by(Expense.date.desc()).limit(5).all()
-    budgets = Budget.query.filter_by(user_id=current_user.id).all()
-    goals = FinancialGoal.query.filter_by(user_id=current_user.id).order_by(FinancialGoal.created_at.desc()).all()
+    # Lists are passed as unexecuted queries: a cached template fragment never runs them
+    expenses = Expense.query.options(joinedload(Expense.category)).filter_by(user_id=current_user.id).order_by(
+        Expense.date.desc()
+    ).limit(5)
+    budgets = Budget.query.options(joinedload(Budget.category)).filter_by(user_id=current_user.id)
+    goals = FinancialGoal.query.filter_by(user_id=current_user.id).order_by(FinancialGoal.created_at.desc())
+    category_spending = partial(category_totals, current_user.id)
+    recurring_charges = RecurringCharge.query.options(joinedload(RecurringCharge.category)).filter_by(
+        user_id=current_user.id, active=True
+    ).order_by(RecurringCharge.next_expected_date)
+
+    def goal_strategies(goals):
+        # Saving strategies for all goals in a single simulation pass, run from the goals fragment
+        try:
+            from services.goals_advisor import suggest_saving_strategies_for_goals
+            return suggest_saving_strategies_for_goals(current_user, goals)
+        except Exception as e:
+            logging.error(f"Error generating goal strategies: {str(e)}")
+            return {}
 
     try:
         from services.expense_predictor import predict_monthly_expenses
-        from services.goals_advisor import suggest_saving_strategies
-        
+
         # Get AI-generated insights and predictions
         ai_insights = analyze_spending_patterns(current_user)
         saving_tip = generate_saving_tip()
         expense_predictions = predict_monthly_expenses(current_user)
-        
-        # Get saving strategies for each goal
-        goal_strategies = {}
-        for goal in goals:
-            goal_strategies[goal.id] = suggest_saving_strategies(current_user, goal)
     except Exception as e:
         logging.error(f"Error generating AI insights: {str(e)}")
         ai_insights = "• Start by tracking your daily expenses to understand your spending patterns\n• Set budgets for different categories to manage your finances better\n• Look for student discounts and deals to save money"
@@ -117,35 +178,25 @@ def dashboard():
                          ai_insights=ai_insights,
                          saving_tip=saving_tip,
                          expense_predictions=expense_predictions,
-                         goal_strategies=goal_strategies)
+                         goal_strategies=goal_strategies,
+                         category_spending=category_spending,
+                         recurring_charges=recurring_charges,
+                         sync_cursor=current_user.data_revision)
 
 @app.route('/api/chat', methods=['POST'])
 @login_required
+@ai_admission('chat')
+@replica_reads()
 def chat():
     try:
         message = request.json.get('message', '').lower()
         if not message:
             return jsonify({'response': 'Please ask me a question about your finances.'}), 400
 
-        # Handle different types of financial queries
-        # Enhanced topic detection for more varied responses
-        if any(word in message for word in ['budget', 'plan', 'allocate']):
-            response = analyze_spending_patterns(current_user)
-        elif any(word in message for word in ['save', 'saving', 'savings', 'tips']):
-            response = generate_saving_tip()
-        elif any(word in message for word in ['invest', 'investment', 'stock', 'future']):
-            response = simulate_financial_scenario("investment advice " + message, current_user)
-        elif any(word in message for word in ['debt', 'loan', 'credit']):
-            response = simulate_financial_scenario("debt management " + message, current_user)
-        elif any(word in message for word in ['earn', 'job', 'income', 'work']):
-            response = simulate_financial_scenario("income opportunities " + message, current_user)
-        elif any(word in message for word in ['emergency', 'fund', 'safety']):
-            response = simulate_financial_scenario("emergency fund " + message, current_user)
-        elif any(word in message for word in ['overspend', 'spent', 'spending']):
-            response = analyze_expense_cause(current_user)
-        else:
-            # General financial advice with enhanced context
-            response = analyze_spending_patterns(current_user)
+        # One pass over the message picks the intent and its amounts/categories
+        response = intent_router.dispatch(
+            message, current_user, default=lambda match, user: analyze_spending_patterns(user)
+        )
 
         if not response or response.isspace():
             response = "I'm here to help you with budgeting, expense tracking, and financial advice. What would you like to know?"
@@ -159,6 +210,7 @@ def chat():
 
 @app.route('/api/voice/process', methods=['POST'])
 @login_required
+@ai_admission('voice')
 def process_voice():
     try:
         # Get audio data from request
@@ -216,6 +268,9 @@ def expenses():
         )
 
         db.session.add(expense)
+        db.session.flush()
+        record_expense(expense)
+        update_recurring_for_expense(expense)
         db.session.commit()
 
         # Check if this expense pushes the category over the notification threshold
@@ -225,10 +280,7 @@ def expenses():
         ).first()
 
         if budget:
-            total_expenses = sum(e.amount for e in Expense.query.filter_by(
-                user_id=current_user.id,
-                category_id=category_id
-            ).all())
+            total_expenses = category_totals(current_user.id, category_id=category_id).get(category_id, 0.0)
 
             percentage = (total_expenses / budget.amount) * 100
             if percentage >= budget.notify_threshold:
@@ -236,9 +288,106 @@ def expenses():
 
         flash('Expense added successfully!', 'success')
 
-    categories = Category.query.all()
-    expenses = Expense.query.filter_by(user_id=current_user.id).order_by(Expense.date.desc()).all()
-    return render_template('expenses.html', categories=categories, expenses=expenses)
+    with replica_reads():
+        # Rendered inside the block: the fragment cache decides whether these queries run at all
+        categories = Category.query.order_by(Category.id)
+        expenses = Expense.query.options(joinedload(Expense.category)).filter_by(user_id=current_user.id).order_by(
+            Expense.date.desc()
+        )
+        return render_template('expenses.html', categories=categories, expenses=expenses)
+
+def is_admin(user):
+    return user.is_authenticated and user.email.lower() in app.config["ADMIN_EMAILS"]
+
+@app.route('/api/export/expenses.<fmt>')
+@login_required
+def export_expenses(fmt):
+    user_id = current_user.id
+    if request.args.get('scope') == 'all':
+        if not is_admin(current_user):
+            return jsonify({'error': 'Unauthorized'}), 403
+        user_id = None
+
+    try:
+        chunks = stream_expenses(fmt, user_id=user_id)
+    except ExportFormatError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def generate():
+        # The body is produced after the view returns, so route it to the replica here
+        with replica_reads():
+            yield from chunks
+
+    filename = f"expenses-{'all' if user_id is None else user_id}-{datetime.now():%Y%m%d}.{fmt}"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@app.route('/api/expenses/search')
+@login_required
+def search_expenses_api():
+    try:
+        filters = {
+            'min_amount': request.args.get('min_amount', type=float),
+            'max_amount': request.args.get('max_amount', type=float),
+            'category_id': request.args.get('category', type=int),
+            'start': request.args.get('start', type=lambda d: datetime.strptime(d, '%Y-%m-%d')),
+            # The end date is inclusive for callers and exclusive in the query
+            'end': request.args.get('end', type=lambda d: datetime.strptime(d, '%Y-%m-%d') + timedelta(days=1)),
+        }
+        with replica_reads():
+            results = search_expenses(
+                current_user.id,
+                request.args.get('q', ''),
+                page=request.args.get('page', 1, type=int),
+                per_page=request.args.get('per_page', 20, type=int),
+                **filters
+            )
+        return jsonify(results)
+    except Exception as e:
+        logging.error(f"Error searching expenses: {str(e)}")
+        return jsonify({'error': 'Search failed'}), 500
+
+@app.route('/api/sync')
+@login_required
+@replica_reads()
+def sync_changes():
+    try:
+        return jsonify(changes_since(current_user.id, request.args.get('cursor')))
+    except SyncError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/sync/expenses', methods=['POST'])
+@login_required
+def sync_upload_expenses():
+    try:
+        results = upload_expenses(current_user.id, (request.get_json(silent=True) or {}).get('expenses'))
+        return jsonify({'results': results})
+    except SyncError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error syncing expenses: {str(e)}")
+        db.session.rollback()
+        return jsonify({'error': 'Sync failed'}), 500
+
+@app.route('/api/admin/llm-stats')
+@login_required
+def llm_stats():
+    if not is_admin(current_user):
+        return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify({**llm_requests.stats(), 'admission': admission_stats()})
+
+@app.route('/api/admin/profiles/<endpoint>.<fmt>')
+@login_required
+def download_profile(endpoint, fmt):
+    if not is_admin(current_user):
+        return jsonify({'error': 'Unauthorized'}), 403
+    if fmt not in PROFILE_FORMATS:
+        return jsonify({'error': f"Unknown format '{fmt}'"}), 400
+    stacks = app.extensions['profiler'].aggregate(endpoint)
+    return Response(render_profile(stacks, fmt, endpoint), mimetype='text/plain' if fmt == 'collapsed' else 'application/json')
 
 @app.route('/budget', methods=['GET', 'POST'])
 @login_required
@@ -338,6 +487,23 @@ def add_goal():
 
     return redirect(url_for('dashboard'))
 
+@app.route('/income', methods=['POST'])
+@login_required
+def update_income():
+    try:
+        value = request.form.get('monthly_income', '').strip()
+        income = float(value) if value else None
+        if income is not None and not 0 <= income < float('inf'):
+            raise ValueError(f"Invalid monthly income '{value}'")
+        current_user.monthly_income = income
+        db.session.commit()
+        flash('Monthly income saved!', 'success')
+    except ValueError as e:
+        logging.error(f"Error saving monthly income: {str(e)}")
+        flash('Please enter your monthly income as a positive number.', 'danger')
+
+    return redirect(url_for('dashboard'))
+
 @app.route('/goals/update/<int:goal_id>', methods=['POST'])
 @login_required
 def update_goal(goal_id):
@@ -362,4 +528,114 @@ def update_goal(goal_id):
         })
     except Exception as e:
         logging.error(f"Error updating goal: {str(e)}")
-        return jsonify({'error': 'Failed to update goal'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Failed to update goal'}), 500
+
+@app.cli.command('archive-expenses')
+@click.option('--horizon-days', type=int, default=None, help='Archive expenses older than this many days')
+def archive_expenses_command(horizon_days):
+    """Roll old expenses into monthly summaries and move them to cold storage."""
+    archived = archive_expenses(horizon_days)
+    click.echo(f"Archived {archived} expenses")
+
+@app.cli.command('export-expenses')
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='csv')
+@click.option('--user-id', type=int, default=None, help='Only export this user (default: all users)')
+@click.option('--output', type=click.Path(dir_okay=False, allow_dash=True), default='-')
+def export_expenses_command(fmt, user_id, output):
+    """Stream expenses with categories joined to a file or stdout."""
+    try:
+        chunks = stream_expenses(fmt, user_id=user_id)
+    except ExportFormatError as e:
+        raise click.ClickException(str(e))
+    binary = fmt == 'parquet'
+    with click.open_file(output, 'wb' if binary else 'w', encoding=None if binary else 'utf-8') as out:
+        for piece in chunks:
+            out.write(piece)
+
+@app.cli.command('backfill-anomalies')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user (default: all users)')
+def backfill_anomalies_command(user_id):
+    """Rebuild spending anomaly detector state from existing expenses."""
+    groups = backfill_spending_state(user_id)
+    click.echo(f"Rebuilt {groups} category states")
+
+@app.cli.command('detect-recurring')
+@click.option('--user-id', type=int, default=None, help='Only rescan this user (default: all users)')
+def detect_recurring_command(user_id):
+    """Rebuild the recurring-charge (subscription) index."""
+    found = detect_recurring_charges(user_id)
+    click.echo(f"Detected {found} recurring charges")
+
+@app.cli.command('seed-synthetic')
+@click.option('--users', type=int, default=3)
+@click.option('--months', type=int, default=18)
+@click.option('--per-month', type=int, default=60, help='Expenses per user per month, besides subscriptions')
+@click.option('--seed', type=int, default=0)
+def seed_synthetic_command(users, months, per_month, seed):
+    """Create synthetic users with realistic expense histories for profiling."""
+    try:
+        user_ids = seed_synthetic_data(users, months, per_month, seed)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Synthetic users {user_ids} ready (password '{SYNTHETIC_PASSWORD}')")
+
+@app.cli.command('profile-route')
+@click.argument('path')
+@click.option('--method', default='GET')
+@click.option('--json-body', default=None, help='JSON request body, e.g. \'{"message": "budget"}\'')
+@click.option('--user-id', type=int, default=None, help='Run as this user (default: synthetic-1)')
+@click.option('--requests', 'n_requests', type=int, default=10)
+@click.option('--interval-ms', type=float, default=1.0, help='Sampling interval')
+@click.option('--format', 'fmt', type=click.Choice(list(PROFILE_FORMATS)), default='speedscope')
+@click.option('--output', type=click.Path(dir_okay=False, allow_dash=True), default=None)
+def profile_route_command(path, method, json_body, user_id, n_requests, interval_ms, fmt, output):
+    """Profile a route in-process and write a flame graph of where its time goes."""
+    user = db.session.get(User, user_id) if user_id else User.query.filter_by(username='synthetic-1').first()
+    if user is None:
+        raise click.ClickException("No such user; run 'flask seed-synthetic' first or pass --user-id")
+    app.secret_key = app.secret_key or os.urandom(16)
+    configure_store(UnlimitedStore())  # Repeated requests must not be degraded by rate limiting
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    kwargs = {'json': json.loads(json_body)} if json_body else {}
+
+    def run_once():
+        # A fresh app context per request, as under a real server
+        with app.app_context():
+            response = client.open(path, method=method, **kwargs)
+            response.get_data()  # Streamed bodies are produced while this runs
+            return response
+
+    run_once()  # Warm-up: caches, compiled templates, connections
+    sampler = StackSampler(interval_ms / 1000)
+    ident = threading.get_ident()
+    timings = []
+    sampler.start(ident)
+    try:
+        for _ in range(n_requests):
+            started = time.perf_counter()
+            response = run_once()
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        stacks = sampler.stop(ident)
+
+    click.echo(f"{method} {path} -> {response.status_code}: median {sorted(timings)[len(timings) // 2]:.1f} ms "
+               f"over {n_requests} requests, {sum(stacks.values())} samples")
+    for bucket, share in time_breakdown(stacks).items():
+        click.echo(f"  {bucket:<10} {share:6.1%}")
+    click.echo("Top functions by self time:")
+    for label, count in top_functions(stacks, 10):
+        click.echo(f"  {count:6d}  {label}")
+
+    if output is None:
+        suffix = PROFILE_FORMATS[fmt][0]
+        name = path.strip('/').replace('/', '-') or 'index'
+        output = os.path.join(app.extensions['profiler'].output_dir, f"{name}{suffix}")
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with click.open_file(output, 'w', encoding='utf-8') as out:
+        out.write(render_profile(stacks, fmt, f"{method} {path}", interval_ms / 1000))
+    if output != '-':
+        click.echo(f"Wrote {output}")
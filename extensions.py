@@ -1,7 +1,72 @@
+import time
+from contextlib import contextmanager
+from flask import current_app, has_request_context, session as flask_session
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.sql.dml import UpdateBase
+
+# Bind key of the optional read replica in SQLALCHEMY_BINDS
+REPLICA_BIND_KEY = "replica"
+# Seconds after a user's write during which their reads stay on the primary
+DEFAULT_REPLICA_LAG_SECONDS = 5.0
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+class RoutingSession(Session):
+    """Session that sends opted-in analytical reads to the read replica.
+
+    Everything else (writes, flushes, reads that are not inside
+    ``replica_reads()``, and all reads shortly after the same user wrote)
+    goes to the primary, so users always read their own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica(clause):
+            return self._db.engines[REPLICA_BIND_KEY]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self, clause):
+        if not self.info.get("replica_reads") or self._flushing:
+            return False
+        if isinstance(clause, UpdateBase) or self.info.get("wrote"):
+            return False
+        if REPLICA_BIND_KEY not in self._db.engines:
+            return False
+        return not _recently_wrote()
+
+def _replica_lag_seconds():
+    return current_app.config.get("SQLALCHEMY_REPLICA_LAG_SECONDS", DEFAULT_REPLICA_LAG_SECONDS)
+
+def _recently_wrote():
+    if not has_request_context():
+        return False
+    last_write = flask_session.get("_db_last_write")
+    return last_write is not None and time.time() - last_write < _replica_lag_seconds()
+
+@event.listens_for(RoutingSession, "after_flush")
+def _track_write(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(RoutingSession, "after_commit")
+def _record_write_time(session):
+    if session.info.pop("wrote", False) and has_request_context():
+        flask_session["_db_last_write"] = time.time()
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_write(session):
+    session.info.pop("wrote", None)
+
+@contextmanager
+def replica_reads():
+    """Route read-only queries in this block (or decorated function) to the replica"""
+    info = db.session().info
+    info["replica_reads"] = info.get("replica_reads", 0) + 1
+    try:
+        yield
+    finally:
+        info["replica_reads"] -= 1
+
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession})
@@ -0,0 +1,71 @@
+"""Production gunicorn settings.
+
+Request handlers spend most of their time waiting on LLM, ASR and TTS
+providers, so each worker serves many requests concurrently (threads by
+default, or gevent greenlets with GUNICORN_WORKER_CLASS=gevent). The app is
+preloaded once in the master and every worker rebuilds its database pool and
+provider clients after fork.
+
+    gunicorn --config gunicorn.conf.py main:app
+"""
+import multiprocessing
+import os
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+
+if worker_class == "gevent":
+    # Must happen before the app (and its sockets/locks) is imported by preload
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        pass
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+# Threads or greenlets already cover the I/O waits, so one process per core is enough;
+# the usual 2 x cores + 1 would multiply the database connections below for no gain
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("GUNICORN_THREADS", 32))
+if worker_class == "gthread":
+    # A thread holds at most one connection, so a pool of `threads` never makes a request
+    # wait and never overflows: the primary sees at most workers x threads connections.
+    # Read by app.py at import, which happens after this file thanks to preload_app.
+    os.environ.setdefault("DB_POOL_SIZE", str(threads))
+    os.environ.setdefault("DB_MAX_OVERFLOW", "0")
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+preload_app = True
+
+# Provider calls can legitimately take tens of seconds
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers periodically to bound memory growth from NumPy/sklearn work
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = 200
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+
+
+def post_fork(server, worker):
+    """Give each worker its own DB connections and provider clients."""
+    from app import app
+    from extensions import db
+    from services import ai_advisor, ai_service
+    from services.voice_service import voice_assistant
+
+    with app.app_context():
+        for engine in db.engines.values():
+            # Keep the parent's connections open for the parent, but never reuse them here
+            engine.dispose(close=False)
+
+    ai_service.reset_client()
+    ai_advisor.reset_client()
+    try:
+        voice_assistant.reinitialize()
+    except Exception as e:
+        server.log.warning(f"Voice assistant unavailable in worker {worker.pid}: {e}")
@@ -8,6 +8,8 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(64), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256))
+    data_revision = db.Column(db.Integer, nullable=False, default=0)  # Bumped whenever synced data changes
+    monthly_income = db.Column(db.Float)  # Take-home pay per month, used for goal forecasts
     expenses = db.relationship('Expense', backref='user', lazy=True)
     budgets = db.relationship('Budget', backref='user', lazy=True)
     goals = db.relationship('FinancialGoal', backref='user', lazy=True)
@@ -24,9 +26,17 @@ class Expense(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     amount = db.Column(db.Float, nullable=False)
     description = db.Column(db.String(256))
-    date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)  # Archive job scans by date
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
+    revision = db.Column(db.Integer, nullable=False, default=0)  # users.data_revision of the last change
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    client_id = db.Column(db.String(64))  # Idempotency key for expenses created offline
+    __table_args__ = (
+        db.Index('ix_expenses_user_revision', 'user_id', 'revision'),
+        db.Index('ix_expenses_user_client', 'user_id', 'client_id', unique=True),
+        {'sqlite_autoincrement': True},  # Archived ids must never be handed out again
+    )
 
 class Budget(db.Model):
     __tablename__ = 'budgets'  # Changed from 'budget' to 'budgets'
@@ -35,6 +45,9 @@ class Budget(db.Model):
     notify_threshold = db.Column(db.Float, default=90.0)  # Percentage at which to notify (default 90%)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
+    revision = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (db.Index('ix_budgets_user_revision', 'user_id', 'revision'),)
 
 class FinancialGoal(db.Model):
     __tablename__ = 'financial_goals'
@@ -45,4 +58,86 @@ class FinancialGoal(db.Model):
     deadline = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='in_progress')  # in_progress, completed, missed
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
\ No newline at end of file
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    revision = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (db.Index('ix_financial_goals_user_revision', 'user_id', 'revision'),)
+
+class ArchivedExpense(db.Model):
+    __tablename__ = 'archived_expenses'  # Cold storage for expenses past the archive horizon
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # Same id as the original expense
+    amount = db.Column(db.Float, nullable=False)
+    description = db.Column(db.String(256))
+    date = db.Column(db.DateTime, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ExpenseMonthlySummary(db.Model):
+    __tablename__ = 'expense_monthly_summaries'  # Per-user, per-category rollup of archived expenses
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
+    month = db.Column(db.Date, nullable=False)  # First day of the month
+    total_amount = db.Column(db.Float, nullable=False, default=0.0)
+    expense_count = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (db.UniqueConstraint('user_id', 'category_id', 'month'),)
+
+class CategorySpendingState(db.Model):
+    __tablename__ = 'category_spending_states'  # Incremental EWMA statistics per user and category
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
+    txn_count = db.Column(db.Integer, nullable=False, default=0)
+    txn_mean = db.Column(db.Float, nullable=False, default=0.0)  # EWMA of single transaction amounts
+    txn_var = db.Column(db.Float, nullable=False, default=0.0)
+    month = db.Column(db.Date)  # Month currently being accumulated
+    month_total = db.Column(db.Float, nullable=False, default=0.0)
+    month_count = db.Column(db.Integer, nullable=False, default=0)  # Completed months folded into the EWMA
+    month_mean = db.Column(db.Float, nullable=False, default=0.0)  # EWMA of completed monthly totals
+    month_var = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    category = db.relationship('Category')
+    __table_args__ = (db.UniqueConstraint('user_id', 'category_id'),)
+
+class SpendingAnomaly(db.Model):
+    __tablename__ = 'spending_anomalies'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
+    expense_id = db.Column(db.Integer)  # Not a foreign key: the expense may move to cold storage
+    kind = db.Column(db.String(20), nullable=False)  # outlier, spike
+    amount = db.Column(db.Float, nullable=False)
+    expected = db.Column(db.Float, nullable=False)
+    score = db.Column(db.Float, nullable=False)  # Standard deviations above the expected value
+    description = db.Column(db.String(256))
+    occurred_at = db.Column(db.DateTime, nullable=False)
+    category = db.relationship('Category')
+
+class RecurringCharge(db.Model):
+    __tablename__ = 'recurring_charges'  # Detected subscriptions and other periodic charges
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
+    merchant_key = db.Column(db.String(128), nullable=False)  # Normalized description
+    description = db.Column(db.String(256))  # Most recent raw description, for display
+    amount = db.Column(db.Float, nullable=False)
+    period_days = db.Column(db.Float, nullable=False)
+    occurrences = db.Column(db.Integer, nullable=False, default=0)
+    last_date = db.Column(db.DateTime, nullable=False)
+    next_expected_date = db.Column(db.DateTime, nullable=False)
+    confidence = db.Column(db.Float, nullable=False, default=0.0)
+    active = db.Column(db.Boolean, nullable=False, default=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    category = db.relationship('Category')
+    __table_args__ = (db.UniqueConstraint('user_id', 'merchant_key'),)
+
+class SyncTombstone(db.Model):
+    __tablename__ = 'sync_tombstones'  # Deleted synced rows, so clients can drop them too
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    entity = db.Column(db.String(20), nullable=False)  # expenses, budgets or goals
+    entity_id = db.Column(db.Integer, nullable=False)
+    revision = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index('ix_sync_tombstones_user_revision', 'user_id', 'revision'),)
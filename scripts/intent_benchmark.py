@@ -0,0 +1,114 @@
+"""Throughput benchmark for the chat/voice intent router.
+
+Parses a corpus of sample utterances with the shared single-pass router and
+with the old chain of keyword scans, and reports utterances per second:
+
+    python scripts/intent_benchmark.py --utterances 200000
+
+The router gets the default categories pinned, so no database is needed.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.intent_router import router  # noqa: E402
+
+DEFAULT_CATEGORIES = [
+    (1, '🍽️ Food'),
+    (2, '🚌 Transportation'),
+    (3, '📚 Education'),
+    (4, '🎮 Entertainment'),
+    (5, '🏠 Utilities'),
+]
+
+SAMPLE_UTTERANCES = [
+    "add expense {amount} dollars for food",
+    "add an expense of ${amount} for transport",
+    "log expense {amount} for my textbook",
+    "record expense {amount} for the internet bill",
+    "budget summary please",
+    "give me a spending summary for this month",
+    "I need some financial advice",
+    "help me plan my budget for next semester",
+    "how should I allocate ${amount} a month",
+    "any tips to save money on groceries",
+    "what are good savings habits for students",
+    "should I invest ${amount} in an index fund",
+    "how do stocks work for my future",
+    "how fast can I pay off a ${amount} loan at 6%",
+    "is my credit card debt a problem",
+    "how can I earn more with a part-time job",
+    "what income can I get from freelance work",
+    "how big should my emergency fund be",
+    "I want a safety net of ${amount}",
+    "what subscriptions am I paying for",
+    "do I still pay for netflix and spotify",
+    "show my recurring charges",
+    "why did I overspend on entertainment",
+    "I spent too much on coffee this week",
+    "where is my spending going",
+    "hello there",
+    "what can you do",
+    "thanks, that was helpful",
+]
+
+# The keyword chain of the original /api/chat route, kept here as the baseline
+LEGACY_CHAIN = [
+    ('budget', ['budget', 'plan', 'allocate']),
+    ('saving', ['save', 'saving', 'savings', 'tips']),
+    ('investment', ['invest', 'investment', 'stock', 'future']),
+    ('debt', ['debt', 'loan', 'credit']),
+    ('income', ['earn', 'job', 'income', 'work']),
+    ('emergency_fund', ['emergency', 'fund', 'safety']),
+    ('overspending', ['overspend', 'spent', 'spending']),
+]
+
+
+def legacy_intent(message):
+    message = message.lower()
+    for name, words in LEGACY_CHAIN:
+        if any(word in message for word in words):
+            return name
+    return None
+
+
+def build_corpus(size, seed):
+    rng = random.Random(seed)
+    return [
+        rng.choice(SAMPLE_UTTERANCES).format(amount=f"{rng.uniform(3, 2500):.2f}")
+        for _ in range(size)
+    ]
+
+
+def measure(label, fn, corpus):
+    start = time.perf_counter()
+    for utterance in corpus:
+        fn(utterance)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {len(corpus) / elapsed:>12,.0f} utterances/s  ({elapsed * 1e6 / len(corpus):.2f} µs each)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--utterances', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--show', type=int, default=0, help='Print the parse of the first N utterances')
+    args = parser.parse_args()
+
+    router.pin_categories(DEFAULT_CATEGORIES)
+    corpus = build_corpus(args.utterances, args.seed)
+    for utterance in corpus[:args.show]:
+        match = router.parse(utterance)
+        print(f"{utterance!r:<60} -> {match.intent} amounts={match.amounts} categories={match.categories}")
+
+    router.parse(corpus[0])  # Compile the pattern outside the timed loop
+    measure("router (intent + amounts + categories)", router.parse, corpus)
+    measure("legacy keyword chain (intent only)", legacy_intent, corpus)
+
+
+if __name__ == '__main__':
+    main()
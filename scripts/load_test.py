@@ -0,0 +1,196 @@
+"""Concurrent-user load test against a slow stub LLM provider.
+
+1. Start the stub provider (OpenAI-compatible, answers after a fixed delay):
+
+       python scripts/load_test.py stub --port 8099 --latency 2.0
+
+2. Start CashAI pointed at it, with result reuse, per-user rate limits and
+   the model-call cap out of the way so every request reaches the provider:
+
+       OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=stub \
+       LLM_RESULT_REUSE_SECONDS=0 AI_RATE_LIMIT_CHAT="100000,100000" AI_MAX_CONCURRENCY=100000 \
+           gunicorn --config gunicorn.conf.py main:app
+
+3. Ramp virtual users against /api/chat and read off where latency departs
+   from the provider latency (that is the instance's concurrent-user capacity):
+
+       python scripts/load_test.py run --url http://127.0.0.1:5000 --users 10 50 100 200
+
+Every message is made unique ({n} in --message), so identical prompts are
+not coalesced, and responses marked X-AI-Degraded (shed by admission
+control) are counted separately rather than as successes.
+
+Only the standard library is used so the script runs anywhere the app does.
+"""
+import argparse
+import http.cookiejar
+import itertools
+import json
+import statistics
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def run_stub(port, latency):
+    """Serve /v1/chat/completions with a canned answer after `latency` seconds."""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(latency)
+            body = json.dumps({
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': 'stub',
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': '💡 Stub tip: cook at home twice a week.'},
+                    'finish_reason': 'stop',
+                }],
+                'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    server.daemon_threads = True
+    print(f"Stub provider on http://127.0.0.1:{port}/v1 (latency {latency}s)")
+    server.serve_forever()
+
+
+class VirtualUser:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def _post_form(self, path, fields):
+        data = urllib.parse.urlencode(fields).encode()
+        return self.opener.open(self.base_url + path, data=data, timeout=60)
+
+    def sign_up(self):
+        name = f"load-{uuid.uuid4().hex[:10]}"
+        fields = {'username': name, 'email': f"{name}@example.com", 'password': 'load-test'}
+        self._post_form('/register', fields)
+        self._post_form('/login', {'email': fields['email'], 'password': fields['password']})
+
+    def chat(self, message):
+        request = urllib.request.Request(
+            self.base_url + '/api/chat',
+            data=json.dumps({'message': message}).encode(),
+            headers={'Content-Type': 'application/json'},
+        )
+        started = time.perf_counter()
+        with self.opener.open(request, timeout=120) as response:
+            response.read()
+            status = response.status
+            degraded = response.headers.get('X-AI-Degraded')
+        return time.perf_counter() - started, status, degraded
+
+
+def run_level(base_url, users, duration, message):
+    """Each virtual user sends chat messages back to back for `duration` seconds."""
+    virtual_users = [VirtualUser(base_url) for _ in range(users)]
+    with ThreadPoolExecutor(max_workers=min(users, 32)) as pool:
+        list(pool.map(lambda u: u.sign_up(), virtual_users))
+
+    latencies, errors, degraded = [], 0, 0
+    lock = threading.Lock()
+    counter = itertools.count(1)
+    deadline = time.perf_counter() + duration
+
+    def drive(user):
+        nonlocal errors, degraded
+        while time.perf_counter() < deadline:
+            with lock:
+                n = next(counter)
+            try:
+                elapsed, status, shed = user.chat(message.format(n=n))
+                ok = status == 200
+            except Exception:
+                elapsed, ok, shed = None, False, None
+            with lock:
+                if not ok:
+                    errors += 1
+                elif shed:
+                    degraded += 1
+                else:
+                    latencies.append(elapsed)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=drive, args=(u,)) for u in virtual_users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    if not latencies:
+        return {'users': users, 'rps': 0.0, 'p50': None, 'p95': None, 'p99': None,
+                'errors': errors, 'degraded': degraded}
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [latencies[0]] * 99
+    return {
+        'users': users,
+        'rps': len(latencies) / wall,
+        'p50': quantiles[49],
+        'p95': quantiles[94],
+        'p99': quantiles[98],
+        'errors': errors,
+        'degraded': degraded,
+    }
+
+
+def run_load(base_url, levels, duration, message, provider_latency):
+    print(f"{'users':>6} {'req/s':>8} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'errors':>7} {'degraded':>9}")
+    for users in levels:
+        result = run_level(base_url, users, duration, message)
+        if result['p50'] is None:
+            print(f"{users:>6} {0:>8.1f} {'-':>7} {'-':>7} {'-':>7} {result['errors']:>7} {result['degraded']:>9}")
+            continue
+        print(f"{users:>6} {result['rps']:>8.1f} {result['p50']:>7.2f} {result['p95']:>7.2f} "
+              f"{result['p99']:>7.2f} {result['errors']:>7} {result['degraded']:>9}")
+        # Once p95 is well above the provider delay, requests are queueing inside the server;
+        # degraded responses mean admission control is already shedding load
+        if result['p95'] > provider_latency * 1.5 or result['errors'] or result['degraded']:
+            print(f"Saturated at about {users} concurrent users")
+            break
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    stub = commands.add_parser('stub', help='run the slow stub provider')
+    stub.add_argument('--port', type=int, default=8099)
+    stub.add_argument('--latency', type=float, default=2.0)
+
+    run = commands.add_parser('run', help='ramp concurrent users against a running instance')
+    run.add_argument('--url', default='http://127.0.0.1:5000')
+    run.add_argument('--users', type=int, nargs='+', default=[10, 25, 50, 100, 200])
+    run.add_argument('--duration', type=float, default=20.0)
+    run.add_argument('--message', default='should I invest ${n} a month for 10 years',
+                     help='{n} is replaced by a request counter so every prompt is unique')
+    run.add_argument('--provider-latency', type=float, default=2.0)
+
+    args = parser.parse_args()
+    if args.command == 'stub':
+        run_stub(args.port, args.latency)
+    else:
+        run_load(args.url, args.users, args.duration, args.message, args.provider_latency)
+
+
+if __name__ == '__main__':
+    main()
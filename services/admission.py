@@ -0,0 +1,227 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from functools import wraps
+from flask import g, has_request_context, make_response, request
+from flask_login import current_user
+from services.single_flight import llm_requests
+
+# Upper bound on model calls in flight: across all workers when the store is
+# shared (Redis), otherwise in each worker process
+AI_MAX_CONCURRENCY = int(os.environ.get("AI_MAX_CONCURRENCY", 8))
+# A slot held longer than this (e.g. by a killed worker) is reclaimed
+AI_SLOT_LEASE_SECONDS = int(os.environ.get("AI_SLOT_LEASE_SECONDS", 120))
+SLOTS_KEY = 'model-calls'
+
+# Token buckets per user and endpoint: (requests per minute, burst).
+# Override with e.g. AI_RATE_LIMIT_CHAT="30,10".
+RATE_LIMITS = {
+    'chat': (20, 5),
+    'voice': (10, 3),
+    'dashboard': (30, 10),
+}
+
+class AdmissionDenied(Exception):
+    """Raised instead of calling a model when the request was not admitted"""
+
+    def __init__(self, reason):
+        super().__init__(f"AI request not admitted: {reason}")
+        self.reason = reason
+
+class MemoryBucketStore:
+    """In-process token buckets and slots (limits apply per worker process)"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._slots = {}
+
+    def acquire(self, key, limit, lease):
+        with self._lock:
+            if self._slots.get(key, 0) >= limit:
+                return None
+            self._slots[key] = self._slots.get(key, 0) + 1
+        return True
+
+    def release(self, key, token):
+        with self._lock:
+            self._slots[key] -= 1
+
+    def take(self, key, rate, capacity):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            if len(self._buckets) > self.max_keys:
+                # A bucket that has refilled is indistinguishable from a new one
+                self._buckets = {k: b for k, b in self._buckets.items() if b[2] > now}
+        return allowed
+
+class RedisBucketStore:
+    """Token buckets and slots shared by all workers through Redis (needs the redis package)"""
+
+    SCRIPT = """
+local rate, capacity, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens = tonumber(redis.call('HGET', KEYS[1], 't') or capacity)
+local updated = tonumber(redis.call('HGET', KEYS[1], 'u') or now)
+tokens = math.min(capacity, tokens + math.max(now - updated, 0) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'u', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return allowed
+"""
+
+    # Slots are leases in a sorted set scored by expiry, so a crashed worker's slots free themselves
+    ACQUIRE_SCRIPT = """
+local limit, lease, now, token = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), ARGV[4]
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= limit then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + lease, token)
+redis.call('EXPIRE', KEYS[1], lease + 1)
+return 1
+"""
+
+    def __init__(self, url, prefix='cashai:bucket:'):
+        import redis
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url)
+        self._take = self._redis.register_script(self.SCRIPT)
+        self._acquire = self._redis.register_script(self.ACQUIRE_SCRIPT)
+
+    def take(self, key, rate, capacity):
+        try:
+            return bool(self._take(keys=[self.prefix + key], args=[rate, capacity, time.time()]))
+        except Exception as e:
+            # Fail open: an unavailable limiter must not take the AI features down with it
+            logging.error(f"Rate limit store unavailable: {str(e)}")
+            return True
+
+    def acquire(self, key, limit, lease):
+        token = uuid.uuid4().hex
+        try:
+            acquired = self._acquire(keys=[self.prefix + key], args=[limit, lease, time.time(), token])
+        except Exception as e:
+            logging.error(f"Rate limit store unavailable: {str(e)}")
+            return token  # Fail open, as for buckets
+        return token if acquired else None
+
+    def release(self, key, token):
+        try:
+            self._redis.zrem(self.prefix + key, token)
+        except Exception as e:
+            logging.error(f"Rate limit store unavailable: {str(e)}")
+
+class UnlimitedStore:
+    """Admits everything; for offline tools such as ``flask profile-route``"""
+
+    def take(self, key, rate, capacity):
+        return True
+
+    def acquire(self, key, limit, lease):
+        return True
+
+    def release(self, key, token):
+        pass
+
+_store = None
+_counters = {'admitted': 0, 'rate_limited': 0, 'saturated': 0, 'served_stale': 0, 'fallbacks': 0}
+_counters_lock = threading.Lock()
+
+def get_store():
+    """The configured bucket and slot store: Redis when RATE_LIMIT_REDIS_URL is set, else in-process"""
+    global _store
+    if _store is None:
+        url = os.environ.get("RATE_LIMIT_REDIS_URL")
+        _store = RedisBucketStore(url) if url else MemoryBucketStore()
+    return _store
+
+def configure_store(store):
+    """Plug in any object with ``take(key, rate, capacity) -> bool`` for buckets and
+    ``acquire(key, limit, lease) -> token or None`` / ``release(key, token)`` for slots"""
+    global _store
+    _store = store
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+def _rate_limit(endpoint):
+    configured = os.environ.get(f"AI_RATE_LIMIT_{endpoint.upper()}")
+    if configured:
+        per_minute, burst = (float(part) for part in configured.split(','))
+        return per_minute, burst
+    return RATE_LIMITS[endpoint]
+
+def ai_admission(endpoint):
+    """Route decorator: take a token from the caller's bucket for ``endpoint``.
+
+    An over-limit request is not rejected; it runs with model calls disabled,
+    so it gets cached answers or the usual fallback text without waiting.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            per_minute, burst = _rate_limit(endpoint)
+            caller = current_user.get_id() or request.remote_addr
+            if not get_store().take(f"{endpoint}:{caller}", per_minute / 60.0, burst):
+                g.ai_degraded = 'rate_limited'
+                _count('rate_limited')
+            response = make_response(view(*args, **kwargs))
+            if g.get('ai_degraded'):
+                response.headers['X-AI-Degraded'] = g.ai_degraded
+            return response
+        return wrapper
+    return decorator
+
+def _admit():
+    reason = g.get('ai_degraded') if has_request_context() else None
+    if reason:
+        raise AdmissionDenied(reason)
+    store = get_store()
+    token = store.acquire(SLOTS_KEY, AI_MAX_CONCURRENCY, AI_SLOT_LEASE_SECONDS)
+    if token is None:
+        _count('saturated')
+        if has_request_context():
+            # Skip the remaining model calls of this request as well
+            g.ai_degraded = 'saturated'
+        raise AdmissionDenied('saturated')
+    _count('admitted')
+    return lambda: store.release(SLOTS_KEY, token)
+
+def call_model(key, fn):
+    """Run a model call under single-flight and admission control.
+
+    Fresh or in-flight identical calls are shared without using a slot. A new
+    upstream call needs an admitted request and a free global slot; otherwise
+    the last answer to the same prompt is returned, or AdmissionDenied is
+    raised for the caller's existing fallback to handle. Denied calls never
+    count as upstream calls in ``llm_requests.stats()``.
+    """
+    try:
+        return llm_requests.do(key, fn, admit=_admit)
+    except AdmissionDenied:
+        stale = llm_requests.last_result(key)
+        if stale is None:
+            _count('fallbacks')
+            raise
+        _count('served_stale')
+        return stale
+
+def admission_stats():
+    with _counters_lock:
+        stats = dict(_counters)
+    stats['max_concurrency'] = AI_MAX_CONCURRENCY
+    return stats
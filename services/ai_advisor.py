@@ -3,9 +3,30 @@ import anthropic
 from datetime import datetime, timedelta
 from models import Expense, Budget, Category
 from extensions import db
+from services.admission import call_model
+from services.single_flight import request_key
 
 # Note that the newest Anthropic model is "claude-3-5-sonnet-20241022" which was released October 22, 2024
-client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+_client = None
+
+def get_client():
+    """Return this process's Anthropic client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+    return _client
+
+def reset_client():
+    """Drop the client inherited from a parent process (called after fork)."""
+    global _client
+    _client = None
+
+def _create_message(**request):
+    """Messages API call through single-flight and admission control"""
+    return call_model(
+        request_key('anthropic', **request),
+        lambda: get_client().messages.create(**request)
+    )
 
 def get_expense_context(user):
     """Get user's expense and budget context for AI analysis"""
@@ -74,7 +95,7 @@ def get_financial_advice(user_query, user):
     Always maintain a supportive and encouraging tone while being realistic about financial constraints."""
 
     try:
-        response = client.messages.create(
+        response = _create_message(
             model="claude-3-5-sonnet-20241022",
             max_tokens=500,
             messages=[
@@ -95,7 +116,7 @@ def suggest_budget_allocation(income, user_categories):
     Format the response as a JSON-like structure with category names and percentages/amounts."""
     
     try:
-        response = client.messages.create(
+        response = _create_message(
             model="claude-3-5-sonnet-20241022",
             max_tokens=300,
             messages=[
@@ -110,7 +131,7 @@ def suggest_budget_allocation(income, user_categories):
 def categorize_expense(description, amount):
     """Use AI to suggest a category for an expense based on its description"""
     try:
-        response = client.messages.create(
+        response = _create_message(
             model="claude-3-5-sonnet-20241022",
             max_tokens=50,
             messages=[
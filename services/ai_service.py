@@ -1,11 +1,36 @@
 import os
+import logging
 from openai import OpenAI
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from models import Expense, Budget, Category
-from extensions import db
+from models import Expense
+from services.admission import call_model
+from services.single_flight import request_key
+from services.anomaly_detector import explain_overspending
+from services.scenario_simulator import run_scenario, user_financial_profile
 
-# Initialize OpenAI client with the provided API key
+# OpenAI client, created lazily so each worker process builds its own connection pool
+_client = None
+
+def get_client():
+    """Return this process's OpenAI client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    return _client
+
+def reset_client():
+    """Drop the client inherited from a parent process (called after fork)."""
+    global _client
+    _client = None
+
+def _chat_completion(**request):
+    """Chat completion through single-flight and admission control"""
+    # Identical concurrent prompts (e.g. the saving tip on every dashboard load) share one call
+    return call_model(
+        request_key('openai', **request),
+        lambda: get_client().chat.completions.create(**request)
+    )
 
 def analyze_spending_patterns(user):
     """Analyze user's spending patterns and generate comprehensive insights."""
@@ -47,7 +72,7 @@ def analyze_spending_patterns(user):
     # Prepare context for OpenAI
     if not expenses:
         try:
-            response = client.chat.completions.create(
+            response = _chat_completion(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": """You are an expert financial advisor specializing in student finances.
@@ -127,7 +152,7 @@ def analyze_spending_patterns(user):
         spending_context += "\n"
 
     try:
-        response = client.chat.completions.create(
+        response = _chat_completion(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": """You are a financial advisor specializing in student finances.
@@ -154,7 +179,7 @@ def analyze_spending_patterns(user):
 def generate_saving_tip():
     """Generate an engaging saving tip for students."""
     try:
-        response = client.chat.completions.create(
+        response = _chat_completion(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": """You are a savvy financial advisor for students.
@@ -174,7 +199,7 @@ def generate_saving_tip():
 def categorize_transaction(description, amount):
     """Use enhanced NLP to categorize transactions based on typical student spending."""
     try:
-        response = client.chat.completions.create(
+        response = _chat_completion(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": """You are an expert at categorizing student expenses.
@@ -212,57 +237,56 @@ def categorize_transaction(description, amount):
         return 'Other'
 
 def analyze_expense_cause(user):
-    """Analyze spending patterns with student-specific insights."""
-    expenses = Expense.query.filter_by(user_id=user.id).all()
-    if not expenses:
+    """Explain overspending from the incremental anomaly detector's state."""
+    try:
+        explanation = explain_overspending(user)
+    except Exception as e:
+        logging.error(f"Error explaining spending: {str(e)}")
+        return "Unable to analyze spending patterns at the moment. Try again later."
+    if explanation is None:
         return """📊 **Start Your Financial Journey!**
 • Track your daily expenses to understand your spending
 • Set realistic budgets based on student lifestyle
 • Look for student-specific savings opportunities"""
+    return explanation
 
-    total_spent = sum(e.amount for e in expenses)
-    categories = {}
-    for expense in expenses:
-        if expense.category.name not in categories:
-            categories[expense.category.name] = 0
-        categories[expense.category.name] += expense.amount
-
+def simulate_financial_scenario(description, user):
+    """Simulate financial scenarios for students."""
     try:
-        context = f"Total spent: **${total_spent:.2f}**\n\nYour spending by category:\n"
-        for category, amount in categories.items():
-            percentage = (amount / total_spent) * 100
-            context += f"• {category}: **${amount:.2f}** ({percentage:.1f}%)\n"
-
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": """Analyze student spending patterns and provide:
-                1. Comparison to typical student budgets
-                2. Specific saving opportunities on campus
-                3. Student discount recommendations
-
-                Format with:
-                - Category-specific emojis
-                - Bold text for important numbers
-                - Student-focused action items"""},
-                {"role": "user", "content": context}
-            ]
-        )
-        return response.choices[0].message.content.strip()
+        projection, profile = run_scenario(description, user)
     except Exception as e:
-        return "Unable to analyze spending patterns at the moment. Try again later."
+        logging.error(f"Error running scenario simulation: {str(e)}")
+        projection, profile = None, None
 
-def simulate_financial_scenario(description, user):
-    """Simulate financial scenarios for students."""
-    current_expenses = sum(e.amount for e in user.expenses) if user.expenses else 0
-    budgets = {b.category.name: b.amount for b in user.budgets}
+    if projection:
+        # The numbers are computed locally; the model only adds a short narrative
+        if os.environ.get("SCENARIO_NARRATION", "1") == "0":
+            return projection
+        try:
+            response = _chat_completion(
+                model="gpt-3.5-turbo",
+                max_tokens=150,
+                messages=[
+                    {"role": "system", "content": """You are a financial advisor for students.
+                    In 2-3 sentences, explain what these precomputed results mean and suggest one next step.
+                    Do not introduce or change any numbers."""},
+                    {"role": "user", "content": projection}
+                ]
+            )
+            return f"{projection}\n\n{response.choices[0].message.content.strip()}"
+        except Exception:
+            logging.exception("Could not explain scenario projection; returning it as is")
+            return projection
+
+    if profile is None:
+        profile = user_financial_profile(user)
 
     try:
-        context = f"""Current monthly expenses: **${current_expenses:.2f}**
-Current budgets: {', '.join(f'{cat}: **${amt:.2f}**' for cat, amt in budgets.items())}
+        context = f"""Current monthly expenses: **${profile['monthly_expenses']:.2f}**
+Current budgets: {', '.join(f'{cat}: **${amt:.2f}**' for cat, amt in profile['budgets'].items())}
 Scenario to analyze: {description}"""
 
-        response = client.chat.completions.create(
+        response = _chat_completion(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": """You are a financial advisor helping a student plan their finances.
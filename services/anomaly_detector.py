@@ -0,0 +1,316 @@
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+import numpy as np
+from sqlalchemy import delete, extract, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from models import Expense, Budget, CategorySpendingState, ExpenseMonthlySummary, SpendingAnomaly
+from extensions import db
+
+TXN_ALPHA = 0.2  # Weight of the newest transaction in the per-category EWMA
+MONTH_ALPHA = 0.3  # Weight of the newest completed month
+OUTLIER_Z = 3.0
+SPIKE_Z = 2.0
+SPIKE_MIN_RATIO = 1.2  # A spike must also be at least 20% above the usual month
+MIN_TXN_HISTORY = 5
+MIN_MONTH_HISTORY = 2
+
+def _month_index(value):
+    return value.year * 12 + value.month - 1
+
+def _month_from_index(index):
+    return date(index // 12, index % 12 + 1, 1)
+
+def _ewma(mean, var, x, alpha):
+    """Exponentially weighted mean/variance update (West, 1979)"""
+    diff = x - mean
+    increment = alpha * diff
+    return mean + increment, (1 - alpha) * (var + diff * increment)
+
+def _ewma_zeros(mean, var, k, alpha):
+    """``k`` updates of ``_ewma`` with x = 0 in closed form, so long gaps cost O(1)"""
+    decay = (1 - alpha) ** k
+    return mean * decay, decay * (var + mean * mean * (1 - decay))
+
+def _z(x, mean, var):
+    std = np.sqrt(var)
+    return (x - mean) / std if std > 0 else 0.0
+
+def _roll_month(state, month):
+    """Fold finished months (including empty ones) into the monthly EWMA"""
+    if state.month is None:
+        state.month, state.month_total = month, 0.0
+        return
+    gap = _month_index(month) - _month_index(state.month)
+    if gap <= 0:
+        return
+    if state.month_count == 0:
+        state.month_mean, state.month_var = state.month_total, 0.0
+    else:
+        state.month_mean, state.month_var = _ewma(state.month_mean, state.month_var, state.month_total, MONTH_ALPHA)
+    state.month_mean, state.month_var = _ewma_zeros(state.month_mean, state.month_var, gap - 1, MONTH_ALPHA)
+    state.month_count += gap
+    state.month, state.month_total = month, 0.0
+
+def _rebuild_months(state):
+    """Replay one category's monthly totals (hot and archived) into the monthly EWMA.
+
+    Same result as the backfill for this category; used when an expense lands
+    in a month that has already been folded in.
+    """
+    year, month = extract('year', Expense.date), extract('month', Expense.date)
+    totals = defaultdict(float)
+    for y, m, total in db.session.execute(
+        select(year, month, func.sum(Expense.amount)).where(
+            Expense.user_id == state.user_id, Expense.category_id == state.category_id
+        ).group_by(year, month)
+    ):
+        totals[int(y) * 12 + int(m) - 1] += total
+    for summary_month, total in db.session.execute(
+        select(ExpenseMonthlySummary.month, ExpenseMonthlySummary.total_amount).where(
+            ExpenseMonthlySummary.user_id == state.user_id,
+            ExpenseMonthlySummary.category_id == state.category_id
+        )
+    ):
+        totals[_month_index(summary_month)] += total
+
+    state.month, state.month_total = None, 0.0
+    state.month_count, state.month_mean, state.month_var = 0, 0.0, 0.0
+    for index in sorted(totals):
+        _roll_month(state, _month_from_index(index))
+        state.month_total += totals[index]
+
+def _spending_state(user_id, category_id):
+    """The (locked) state row for a category, created if this is its first expense"""
+    query = CategorySpendingState.query.filter_by(user_id=user_id, category_id=category_id).with_for_update()
+    state = query.first()
+    if state is None:
+        try:
+            with db.session.begin_nested():
+                state = CategorySpendingState(
+                    user_id=user_id, category_id=category_id,
+                    txn_count=0, txn_mean=0.0, txn_var=0.0,
+                    month_total=0.0, month_count=0, month_mean=0.0, month_var=0.0
+                )
+                db.session.add(state)
+        except IntegrityError:
+            # A concurrent request created it first; update that row instead
+            state = query.one()
+    return state
+
+def record_expense(expense):
+    """Update the category state for a new expense and flag it if it is unusual.
+
+    Touches one state row, so the cost does not grow with the user's history
+    (a back-dated expense re-reads the category's monthly totals).
+    Call after the expense is flushed (it needs an id) and before commit.
+    """
+    state = _spending_state(expense.user_id, expense.category_id)
+
+    amount = expense.amount
+    if state.txn_count >= MIN_TXN_HISTORY:
+        score = _z(amount, state.txn_mean, state.txn_var)
+        if score >= OUTLIER_Z:
+            db.session.add(SpendingAnomaly(
+                user_id=expense.user_id, category_id=expense.category_id, expense_id=expense.id,
+                kind='outlier', amount=amount, expected=state.txn_mean, score=float(score),
+                description=expense.description, occurred_at=expense.date
+            ))
+    if state.txn_count == 0:
+        state.txn_mean, state.txn_var = amount, 0.0
+    else:
+        state.txn_mean, state.txn_var = _ewma(state.txn_mean, state.txn_var, amount, TXN_ALPHA)
+    state.txn_count += 1
+
+    month = date(expense.date.year, expense.date.month, 1)
+    _roll_month(state, month)
+    if month != state.month:
+        # Back-dated expense: its month is already in the EWMA
+        _rebuild_months(state)
+        return state
+    state.month_total += amount
+    _check_spike(state, expense.date)
+    return state
+
+def _check_spike(state, occurred_at):
+    if state.month_count < MIN_MONTH_HISTORY:
+        return
+    score = _z(state.month_total, state.month_mean, state.month_var)
+    if score < SPIKE_Z or state.month_total < state.month_mean * SPIKE_MIN_RATIO:
+        return
+    already_flagged = SpendingAnomaly.query.filter(
+        SpendingAnomaly.user_id == state.user_id,
+        SpendingAnomaly.category_id == state.category_id,
+        SpendingAnomaly.kind == 'spike',
+        SpendingAnomaly.occurred_at >= datetime(state.month.year, state.month.month, 1)
+    ).first()
+    if already_flagged:
+        already_flagged.amount = state.month_total
+        already_flagged.score = float(score)
+    else:
+        db.session.add(SpendingAnomaly(
+            user_id=state.user_id, category_id=state.category_id, kind='spike',
+            amount=state.month_total, expected=state.month_mean, score=float(score),
+            occurred_at=occurred_at
+        ))
+
+def _grouped_ewma(groups, values, alpha, n_groups):
+    """EWMA over many series at once; ``values`` must be sorted by group, then time.
+
+    Steps through positions within each group, updating every group that is
+    still active with one vectorized operation per step. Returns the final
+    mean/var/count per group plus the mean and z-score seen by each value
+    before its own update.
+    """
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    mean = np.zeros(n_groups)
+    var = np.zeros(n_groups)
+    z_before = np.zeros(len(values))
+    mean_before = np.zeros(len(values))
+    for step in range(counts.max() if len(values) else 0):
+        active = np.nonzero(counts > step)[0]
+        idx = starts[active] + step
+        x = values[idx]
+        if step == 0:
+            mean[active] = x
+            continue
+        mean_before[idx] = mean[active]
+        std = np.sqrt(var[active])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z_before[idx] = np.where(std > 0, (x - mean[active]) / std, 0.0)
+        diff = x - mean[active]
+        increment = alpha * diff
+        mean[active] += increment
+        var[active] = (1 - alpha) * (var[active] + diff * increment)
+    return mean, var, counts, starts, mean_before, z_before
+
+def backfill_spending_state(user_id=None):
+    """Rebuild detector state (and historical outliers) from existing expenses"""
+    stmt = select(Expense.id, Expense.user_id, Expense.category_id, Expense.date,
+                  Expense.amount, Expense.description)
+    summaries = select(ExpenseMonthlySummary.user_id, ExpenseMonthlySummary.category_id,
+                       ExpenseMonthlySummary.month, ExpenseMonthlySummary.total_amount)
+    if user_id is not None:
+        stmt = stmt.where(Expense.user_id == user_id)
+        summaries = summaries.where(ExpenseMonthlySummary.user_id == user_id)
+    rows = db.session.execute(stmt).all()
+    summary_rows = db.session.execute(summaries).all()
+
+    if user_id is None:
+        db.session.execute(delete(CategorySpendingState))
+        db.session.execute(delete(SpendingAnomaly).where(SpendingAnomaly.kind == 'outlier'))
+    else:
+        db.session.execute(delete(CategorySpendingState).where(CategorySpendingState.user_id == user_id))
+        db.session.execute(delete(SpendingAnomaly).where(
+            SpendingAnomaly.user_id == user_id, SpendingAnomaly.kind == 'outlier'
+        ))
+    if not rows and not summary_rows:
+        db.session.commit()
+        return 0
+
+    ids, users, cats, dates, amounts, descriptions = (list(col) for col in zip(*rows)) if rows else ([],) * 6
+    users = np.array(users + [r.user_id for r in summary_rows], dtype=np.int64)
+    cats = np.array(cats + [r.category_id for r in summary_rows], dtype=np.int64)
+    months = np.array([_month_index(d) for d in dates] + [_month_index(r.month) for r in summary_rows], dtype=np.int64)
+    n_txn = len(rows)
+
+    pair_keys, group_of = np.unique(np.stack([users, cats], axis=1), axis=0, return_inverse=True)
+    group_of = group_of.ravel()
+    n_groups = len(pair_keys)
+
+    # Transaction-level EWMA over hot expenses, in date order within each group
+    txn_group = group_of[:n_txn]
+    txn_amounts = np.array(amounts, dtype=float)
+    txn_order = np.lexsort((np.array([d.timestamp() for d in dates]), txn_group)) if n_txn else np.array([], dtype=int)
+    txn_mean, txn_var, txn_counts, txn_starts, txn_expected, txn_z = _grouped_ewma(
+        txn_group[txn_order], txn_amounts[txn_order], TXN_ALPHA, n_groups
+    )
+    position = np.arange(n_txn) - txn_starts[txn_group[txn_order]] if n_txn else np.array([], dtype=int)
+    flagged = np.nonzero((txn_z >= OUTLIER_Z) & (position >= MIN_TXN_HISTORY))[0]
+
+    # Monthly totals (hot + archived) on a dense month grid per group
+    month_amounts = np.concatenate([txn_amounts, np.array([r.total_amount for r in summary_rows], dtype=float)])
+    first = np.full(n_groups, np.iinfo(np.int64).max)
+    last = np.full(n_groups, np.iinfo(np.int64).min)
+    np.minimum.at(first, group_of, months)
+    np.maximum.at(last, group_of, months)
+    span = last - first + 1
+    offsets = np.concatenate(([0], np.cumsum(span)[:-1]))
+    dense = np.bincount(offsets[group_of] + months - first[group_of], weights=month_amounts, minlength=span.sum())
+    dense_group = np.repeat(np.arange(n_groups), span)
+
+    # The last month of each group is the one still being accumulated
+    completed = np.ones(len(dense), dtype=bool)
+    completed[offsets + span - 1] = False
+    month_mean, month_var, month_counts, _, _, _ = _grouped_ewma(
+        dense_group[completed], dense[completed], MONTH_ALPHA, n_groups
+    )
+
+    db.session.execute(insert(CategorySpendingState), [
+        {
+            'user_id': int(pair_keys[g, 0]), 'category_id': int(pair_keys[g, 1]),
+            'txn_count': int(txn_counts[g]), 'txn_mean': float(txn_mean[g]), 'txn_var': float(txn_var[g]),
+            'month': _month_from_index(int(last[g])), 'month_total': float(dense[offsets[g] + span[g] - 1]),
+            'month_count': int(month_counts[g]), 'month_mean': float(month_mean[g]), 'month_var': float(month_var[g]),
+        }
+        for g in range(n_groups)
+    ])
+    if len(flagged):
+        sorted_rows = txn_order[flagged]
+        db.session.execute(insert(SpendingAnomaly), [
+            {
+                'user_id': users[i].item(), 'category_id': cats[i].item(), 'expense_id': ids[i],
+                'kind': 'outlier', 'amount': amounts[i],
+                'expected': float(txn_expected[f]),
+                'score': float(txn_z[f]), 'description': descriptions[i], 'occurred_at': dates[i],
+            }
+            for f, i in zip(flagged, sorted_rows)
+        ])
+    db.session.commit()
+    logging.info(f"Backfilled {n_groups} category states and {len(flagged)} outliers")
+    return n_groups
+
+def explain_overspending(user, days=60, limit=3):
+    """Explain this month's overspending from detector state, without scanning expenses"""
+    states = CategorySpendingState.query.filter_by(user_id=user.id).all()
+    if not states:
+        return None
+    this_month = date.today().replace(day=1)
+    budgets = {b.category_id: b.amount for b in Budget.query.filter_by(user_id=user.id)}
+
+    lines = ["📊 **What's driving your spending this month**"]
+    current = [s for s in states if s.month == this_month and s.month_total > 0]
+    for state in sorted(current, key=lambda s: s.month_total, reverse=True):
+        name = state.category.name
+        budget = budgets.get(state.category_id)
+        if budget and state.month_total > budget:
+            lines.append(f"• {name}: **${state.month_total:.2f}** spent, **${state.month_total - budget:.2f}** over your ${budget:.2f} budget")
+        elif state.month_count >= MIN_MONTH_HISTORY and state.month_total > state.month_mean * SPIKE_MIN_RATIO:
+            above = (state.month_total / state.month_mean - 1) * 100 if state.month_mean > 0 else 100
+            lines.append(f"• {name}: **${state.month_total:.2f}** so far, **{above:.0f}%** above your usual ${state.month_mean:.2f}")
+
+    recent = SpendingAnomaly.query.filter(
+        SpendingAnomaly.user_id == user.id,
+        SpendingAnomaly.kind == 'outlier',
+        SpendingAnomaly.occurred_at >= datetime.now() - timedelta(days=days)
+    ).order_by(SpendingAnomaly.score.desc()).limit(limit).all()
+    if recent:
+        lines.append("\n🔎 **Unusual transactions**")
+        for anomaly in recent:
+            label = f" ({anomaly.description})" if anomaly.description else ""
+            lines.append(
+                f"• **${anomaly.amount:.2f}** on {anomaly.occurred_at:%b %d} in {anomaly.category.name}{label}, "
+                f"vs. a typical ${anomaly.expected:.2f}"
+            )
+
+    if len(lines) == 1:
+        top = max(states, key=lambda s: s.month_total if s.month == this_month else 0)
+        if top.month != this_month or top.month_total == 0:
+            return "✅ No spending recorded this month yet, and nothing unusual in your recent history."
+        if top.month_count == 0:
+            return (f"✅ Nothing unusual this month. Your biggest category is {top.category.name} "
+                    f"at **${top.month_total:.2f}**; there is no earlier month to compare it with yet.")
+        return (f"✅ Nothing unusual this month. Your biggest category is {top.category.name} "
+                f"at **${top.month_total:.2f}**, in line with your usual ${top.month_mean:.2f}.")
+    return "\n".join(lines)
@@ -0,0 +1,161 @@
+import logging
+import os
+from datetime import date, datetime, timedelta
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.schema import CreateTable
+from models import Expense, ArchivedExpense, ExpenseMonthlySummary
+from extensions import db
+
+# Expenses older than this many days are rolled up and moved to cold storage
+ARCHIVE_HORIZON_DAYS = int(os.environ.get("EXPENSE_ARCHIVE_HORIZON_DAYS", 365))
+ARCHIVE_BATCH_SIZE = 5000
+
+def _month_start(value):
+    return date(value.year, value.month, 1)
+
+def archive_cutoff(horizon_days=None, now=None):
+    """Start of the month containing now - horizon, so only whole months are archived"""
+    horizon_days = ARCHIVE_HORIZON_DAYS if horizon_days is None else horizon_days
+    boundary = (now or datetime.now()) - timedelta(days=horizon_days)
+    return datetime(boundary.year, boundary.month, 1)
+
+def ensure_archive_schema():
+    """Keep expense ids unique across hot and archived rows on SQLite.
+
+    Without AUTOINCREMENT SQLite reuses the highest rowid once that row is
+    archived, so tables created before it was declared are rebuilt, and the
+    id sequence is moved past every archived id.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return
+    table = Expense.__table__
+    with db.engine.begin() as conn:
+        ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                           {'name': table.name}).scalar()
+        if 'AUTOINCREMENT' not in ddl.upper():
+            existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table.name})"))}
+            columns = ', '.join(c.name for c in table.columns if c.name in existing)
+            rebuilt = f"{table.name}_rebuild"
+            create = str(CreateTable(table).compile(dialect=conn.dialect))
+            conn.execute(text(create.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {rebuilt} ", 1)))
+            conn.execute(text(f"INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {table.name}"))
+            # Dropping also removes the old indexes and triggers; both are recreated at startup
+            conn.execute(text(f"DROP TABLE {table.name}"))
+            conn.execute(text(f"ALTER TABLE {rebuilt} RENAME TO {table.name}"))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+            logging.info(f"Rebuilt {table.name} with AUTOINCREMENT ids")
+
+        top = conn.execute(select(func.max(ArchivedExpense.id))).scalar() or 0
+        sequence = conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = :name"), {'name': table.name}).first()
+        if sequence is None:
+            conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+                         {'name': table.name, 'seq': top})
+        elif sequence.seq < top:
+            conn.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = :name"),
+                         {'name': table.name, 'seq': top})
+
+def archive_expenses(horizon_days=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """Roll old expenses into monthly summaries and move the raw rows to cold storage.
+
+    Works in id-ordered batches, each in its own transaction, so memory stays
+    bounded and an interrupted run can simply be restarted.
+    """
+    cutoff = archive_cutoff(horizon_days)
+    archived = 0
+    while True:
+        rows = db.session.execute(
+            select(Expense.id, Expense.amount, Expense.description, Expense.date,
+                   Expense.user_id, Expense.category_id)
+            .where(Expense.date < cutoff)
+            .order_by(Expense.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        rollup = {}
+        for row in rows:
+            key = (row.user_id, row.category_id, _month_start(row.date))
+            total, count = rollup.get(key, (0.0, 0))
+            rollup[key] = (total + row.amount, count + 1)
+        _merge_into_summaries(rollup)
+
+        # Remove the hot rows first: their ids are reused in cold storage. The
+        # session is synchronized so no stale Expense stays in the identity map.
+        db.session.execute(delete(Expense).where(Expense.id.in_([r.id for r in rows])))
+        now = datetime.utcnow()
+        db.session.execute(insert(ArchivedExpense), [
+            {'id': r.id, 'amount': r.amount, 'description': r.description, 'date': r.date,
+             'user_id': r.user_id, 'category_id': r.category_id, 'archived_at': now}
+            for r in rows
+        ])
+        db.session.commit()
+        archived += len(rows)
+        logging.info(f"Archived {archived} expenses older than {cutoff:%Y-%m-%d}")
+    return archived
+
+def _merge_into_summaries(rollup):
+    user_ids = {user_id for user_id, _, _ in rollup}
+    existing = {
+        (s.user_id, s.category_id, s.month): s
+        for s in ExpenseMonthlySummary.query.filter(
+            ExpenseMonthlySummary.user_id.in_(user_ids),
+            ExpenseMonthlySummary.month.in_({month for _, _, month in rollup})
+        )
+    }
+    for (user_id, category_id, month), (total, count) in rollup.items():
+        summary = existing.get((user_id, category_id, month))
+        if summary is None:
+            db.session.add(ExpenseMonthlySummary(
+                user_id=user_id, category_id=category_id, month=month,
+                total_amount=total, expense_count=count
+            ))
+        else:
+            summary.total_amount += total
+            summary.expense_count += count
+    db.session.flush()
+
+def category_totals(user_id, since=None, category_id=None):
+    """Spending per category id across hot expenses and archived monthly summaries.
+
+    ``since`` is exact for hot rows and month-granular for summarized history.
+    """
+    hot = db.session.query(Expense.category_id, func.sum(Expense.amount)).filter(Expense.user_id == user_id)
+    cold = db.session.query(ExpenseMonthlySummary.category_id, func.sum(ExpenseMonthlySummary.total_amount)).filter(
+        ExpenseMonthlySummary.user_id == user_id
+    )
+    if since is not None:
+        hot = hot.filter(Expense.date >= since)
+        cold = cold.filter(ExpenseMonthlySummary.month >= _month_start(since))
+    if category_id is not None:
+        hot = hot.filter(Expense.category_id == category_id)
+        cold = cold.filter(ExpenseMonthlySummary.category_id == category_id)
+
+    totals = {}
+    for query in (hot.group_by(Expense.category_id), cold.group_by(ExpenseMonthlySummary.category_id)):
+        for cat_id, total in query:
+            totals[cat_id] = totals.get(cat_id, 0.0) + (total or 0.0)
+    return totals
+
+def expense_points(user_id):
+    """(date, amount, weight, category_id) observations covering the whole history.
+
+    Hot expenses are individual points of weight 1; each archived month is one
+    point at mid-month carrying the average amount, weighted by its count.
+    """
+    points = [
+        (row.date, row.amount, 1, row.category_id)
+        for row in db.session.execute(
+            select(Expense.date, Expense.amount, Expense.category_id).where(Expense.user_id == user_id)
+        )
+    ]
+    for summary in ExpenseMonthlySummary.query.filter_by(user_id=user_id):
+        if summary.expense_count:
+            points.append((
+                datetime(summary.month.year, summary.month.month, 15),
+                summary.total_amount / summary.expense_count,
+                summary.expense_count,
+                summary.category_id,
+            ))
+    return points
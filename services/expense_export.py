@@ -0,0 +1,129 @@
+import csv
+import io
+import json
+from sqlalchemy import false, select, true, union_all
+from models import Expense, ArchivedExpense, Category
+from extensions import db
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_COLUMNS = ['id', 'user_id', 'date', 'category', 'amount', 'description', 'archived']
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+class ExportFormatError(ValueError):
+    """Raised for an unknown export format or a missing optional dependency"""
+
+def _expense_select(model, archived, user_id):
+    stmt = select(
+        model.id, model.user_id, model.date, Category.name.label('category'),
+        model.amount, model.description, (true() if archived else false()).label('archived')
+    ).join(Category, model.category_id == Category.id)
+    if user_id is not None:
+        stmt = stmt.where(model.user_id == user_id)
+    return stmt
+
+def iter_expense_chunks(user_id=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of export rows (hot and archived expenses) from a server-side cursor.
+
+    ``user_id=None`` exports every user's expenses.
+    """
+    stmt = union_all(
+        _expense_select(Expense, False, user_id),
+        _expense_select(ArchivedExpense, True, user_id),
+    )
+    result = db.session.execute(
+        stmt, execution_options={'stream_results': True, 'yield_per': chunk_size}
+    )
+    try:
+        for chunk in result.partitions(chunk_size):
+            yield chunk
+    finally:
+        result.close()
+
+def _csv_stream(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            (r.id, r.user_id, r.date.isoformat(), r.category, f"{r.amount:.2f}", r.description or '', int(bool(r.archived)))
+            for r in chunk
+        )
+        yield buffer.getvalue()
+
+def _jsonl_stream(chunks):
+    for chunk in chunks:
+        yield ''.join(
+            json.dumps({
+                'id': r.id, 'user_id': r.user_id, 'date': r.date.isoformat(), 'category': r.category,
+                'amount': r.amount, 'description': r.description, 'archived': bool(r.archived)
+            }, ensure_ascii=False) + '\n'
+            for r in chunk
+        )
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose contents are handed out as they are produced"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+def _parquet_stream(chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('id', pa.int64()), ('user_id', pa.int64()), ('date', pa.timestamp('us')),
+        ('category', pa.string()), ('amount', pa.float64()), ('description', pa.string()),
+        ('archived', pa.bool_()),
+    ])
+    sink = _DrainableSink()
+    # Each chunk becomes one row group, so bytes flow out as soon as a chunk is encoded
+    with pq.ParquetWriter(sink, schema, compression='snappy') as writer:
+        for chunk in chunks:
+            columns = list(zip(*chunk))
+            columns[6] = [bool(v) for v in columns[6]]
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema
+            ))
+            yield sink.drain()
+    yield sink.drain()
+
+def stream_expenses(fmt, user_id=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Return a generator of str/bytes pieces of the export in the given format"""
+    if fmt not in EXPORT_FORMATS:
+        raise ExportFormatError(f"Unsupported export format '{fmt}'. Choose from: {', '.join(EXPORT_FORMATS)}")
+    if fmt == 'parquet':
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ExportFormatError("Parquet export requires the pyarrow package")
+
+    chunks = iter_expense_chunks(user_id, chunk_size)
+    if fmt == 'csv':
+        return _csv_stream(chunks)
+    if fmt == 'jsonl':
+        return _jsonl_stream(chunks)
+    return _parquet_stream(chunks)
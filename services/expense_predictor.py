@@ -1,26 +1,36 @@
-
 import numpy as np
 from datetime import datetime, timedelta
 from sklearn.linear_model import LinearRegression
-from models import Expense
+from services.expense_archive import expense_points
+from services.recurring_charges import upcoming_charges
 
 def predict_monthly_expenses(user):
     """Predict next month's expenses using historical data"""
-    expenses = Expense.query.filter_by(user_id=user.id).all()
-    
-    # Prepare training data
-    dates = np.array([(e.date - datetime.now()).days for e in expenses]).reshape(-1, 1)
-    amounts = np.array([e.amount for e in expenses])
+    points = expense_points(user.id)
+    now = datetime.now()
+
+    # Prepare training data; archived months enter as weighted monthly averages
+    dates = np.array([(d - now).days for d, _, _, _ in points]).reshape(-1, 1)
+    amounts = np.array([amount for _, amount, _, _ in points])
+    weights = np.array([weight for _, _, weight, _ in points])
     
     # Train model
     model = LinearRegression()
-    model.fit(dates, amounts)
+    model.fit(dates, amounts, sample_weight=weights)
     
     # Predict next 30 days
     future_dates = np.array(range(1, 31)).reshape(-1, 1)
     predictions = model.predict(future_dates)
     
+    # Subscriptions due in the next 30 days, read from the recurring-charge index
+    upcoming = upcoming_charges(user.id, days=30)
+
     return {
         'total_predicted': sum(predictions),
-        'daily_breakdown': [{'day': i, 'amount': amount} for i, amount in enumerate(predictions, 1)]
+        'daily_breakdown': [{'day': i, 'amount': amount} for i, amount in enumerate(predictions, 1)],
+        'recurring_upcoming': sum(charge.amount for charge in upcoming),
+        'recurring_charges': [
+            {'name': charge.description, 'amount': charge.amount, 'date': charge.next_expected_date.strftime('%Y-%m-%d')}
+            for charge in upcoming
+        ]
     }
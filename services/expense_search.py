@@ -0,0 +1,174 @@
+import logging
+import re
+from datetime import datetime
+from sqlalchemy import DateTime, bindparam, text
+from extensions import db
+
+SEARCH_TABLES = ('expenses', 'archived_expenses')
+MAX_PER_PAGE = 100
+
+# SQLite: a contentless FTS5 index per table, keyed by that table's rowid. The
+# owner column holds a "u<user_id>" token so a user's matches are an index
+# intersection rather than a post-filter.
+SQLITE_FTS_TABLE = """
+CREATE VIRTUAL TABLE {table}_fts USING fts5(
+    description, owner, content='', tokenize='porter unicode61'
+)
+"""
+SQLITE_TRIGGER_NAMES = ('insert', 'delete', 'update')
+SQLITE_TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+    INSERT INTO {table}_fts(rowid, description, owner) VALUES (new.id, new.description, 'u' || new.user_id);
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+    INSERT INTO {table}_fts({table}_fts, rowid, description, owner) VALUES ('delete', old.id, old.description, 'u' || old.user_id);
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF description, user_id ON {table} BEGIN
+    INSERT INTO {table}_fts({table}_fts, rowid, description, owner) VALUES ('delete', old.id, old.description, 'u' || old.user_id);
+    INSERT INTO {table}_fts(rowid, description, owner) VALUES (new.id, new.description, 'u' || new.user_id);
+END;
+"""
+
+# PostgreSQL: a stored generated tsvector is kept in sync by the database itself
+POSTGRES_INDEX = """
+ALTER TABLE {table} ADD COLUMN IF NOT EXISTS description_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', coalesce(description, ''))) STORED;
+CREATE INDEX IF NOT EXISTS ix_{table}_description_tsv ON {table} USING GIN (description_tsv);
+CREATE INDEX IF NOT EXISTS ix_{table}_user_date ON {table} (user_id, date);
+"""
+
+def _dialect():
+    return db.engine.dialect.name
+
+def ensure_search_index():
+    """Create the full-text index and its sync triggers if they are missing"""
+    dialect = _dialect()
+    with db.engine.begin() as conn:
+        if dialect == 'sqlite':
+            existing = set(conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )).scalars())
+            if 'expenses_fts' in existing and 'archived_expenses_fts' not in existing:
+                # Older databases shared one index between both tables; rebuild it per table
+                conn.execute(text("DROP TABLE expenses_fts"))
+                existing.discard('expenses_fts')
+            for table in SEARCH_TABLES:
+                if f'{table}_fts' not in existing:
+                    for name in SQLITE_TRIGGER_NAMES:
+                        conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_fts_{name}"))
+                    conn.execute(text(SQLITE_FTS_TABLE.format(table=table)))
+                    conn.execute(text(
+                        f"INSERT INTO {table}_fts(rowid, description, owner) "
+                        f"SELECT id, description, 'u' || user_id FROM {table}"
+                    ))
+                for statement in SQLITE_TRIGGERS.format(table=table).split('END;'):
+                    if statement.strip():
+                        conn.execute(text(statement + 'END;'))
+        elif dialect == 'postgresql':
+            for table in SEARCH_TABLES:
+                for statement in POSTGRES_INDEX.format(table=table).split(';'):
+                    if statement.strip():
+                        conn.execute(text(statement))
+        else:
+            logging.warning(f"No full-text index for dialect '{dialect}'; search falls back to LIKE")
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())
+
+def _filters(filters, params):
+    clauses = []
+    for key, clause in (
+        ('min_amount', 'e.amount >= :min_amount'),
+        ('max_amount', 'e.amount <= :max_amount'),
+        ('start', 'e.date >= :start'),
+        ('end', 'e.date < :end'),
+        ('category_id', 'e.category_id = :category_id'),
+    ):
+        if filters.get(key) is not None:
+            clauses.append(clause)
+            params[key] = filters[key]
+    return ''.join(f' AND {clause}' for clause in clauses)
+
+def _ranked_selects(dialect, terms, params, extra):
+    selects = []
+    for table in SEARCH_TABLES:
+        archived = 'true' if table == 'archived_expenses' else 'false'
+        columns = f"e.id, e.date, e.amount, e.description, e.category_id, {archived} AS archived"
+        if dialect == 'sqlite':
+            # Exact terms go through the porter stemmer; the prefix form handles partial words
+            params['match'] = f'owner:"u{params["user_id"]}"' + ''.join(
+                f' AND (description:"{term}" OR description:"{term}"*)' for term in terms
+            )
+            ranked = (
+                f"SELECT {columns}, -bm25({table}_fts) AS raw FROM {table}_fts "
+                f"JOIN {table} e ON e.id = {table}_fts.rowid "
+                f"WHERE {table}_fts MATCH :match AND e.user_id = :user_id{extra}"
+            )
+        elif dialect == 'postgresql':
+            params['match'] = ' & '.join(f'{term}:*' for term in terms)
+            ranked = (
+                f"SELECT {columns}, ts_rank(e.description_tsv, to_tsquery('english', :match)) AS raw "
+                f"FROM {table} e WHERE e.user_id = :user_id "
+                f"AND e.description_tsv @@ to_tsquery('english', :match){extra}"
+            )
+        else:
+            like = []
+            for i, term in enumerate(terms):
+                params[f'term{i}'] = f'%{term}%'
+                like.append(f"lower(e.description) LIKE :term{i}")
+            selects.append(
+                f"SELECT {columns}, 0 AS score FROM {table} e "
+                f"WHERE e.user_id = :user_id AND {' AND '.join(like)}{extra}"
+            )
+            continue
+        # Raw scores depend on each index's own statistics (document count, average
+        # length), so they are scaled to the table's best match before the union
+        selects.append(
+            f"SELECT id, date, amount, description, category_id, archived, "
+            f"coalesce(raw / nullif(max(raw) OVER (), 0), 0) AS score FROM ({ranked}) AS {table}_ranked"
+        )
+    return ' UNION ALL '.join(selects)
+
+def search_expenses(user_id, query, page=1, per_page=20, **filters):
+    """Ranked, paginated full-text search over a user's hot and archived expenses.
+
+    Supported filters: min_amount, max_amount, start, end (exclusive) and category_id.
+    """
+    terms = _terms(query or '')
+    page = max(int(page), 1)
+    per_page = min(max(int(per_page), 1), MAX_PER_PAGE)
+    if not terms:
+        return {'results': [], 'total': 0, 'page': page, 'per_page': per_page}
+
+    params = {'user_id': user_id}
+    extra = _filters(filters, params)
+    matches = _ranked_selects(_dialect(), terms, params, extra)
+
+    # Date bounds need the column type so they compare correctly on every dialect
+    typed = [bindparam(key, type_=DateTime) for key in ('start', 'end') if key in params]
+
+    total = db.session.execute(
+        text(f"SELECT count(*) FROM ({matches}) AS m").bindparams(*typed), params
+    ).scalar()
+    params.update(limit=per_page, offset=(page - 1) * per_page)
+    rows = db.session.execute(text(
+        f"SELECT * FROM ({matches}) AS m ORDER BY score DESC, date DESC LIMIT :limit OFFSET :offset"
+    ).bindparams(*typed), params).mappings().all()
+
+    return {
+        'results': [
+            {
+                'id': row['id'],
+                'date': (datetime.fromisoformat(row['date']) if isinstance(row['date'], str) else row['date']).isoformat(),
+                'amount': row['amount'],
+                'description': row['description'],
+                'category_id': row['category_id'],
+                'archived': bool(row['archived']),
+                'score': float(row['score']),
+            }
+            for row in rows
+        ],
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+    }
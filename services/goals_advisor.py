@@ -1,29 +1,130 @@
-
 from datetime import datetime, timedelta
-from models import FinancialGoal, Expense
-import anthropic
+import numpy as np
+from models import FinancialGoal, Expense, Category
+from extensions import db
+from services.expense_archive import category_totals, expense_points
+
+DEFAULT_SIMULATION_PATHS = 5000
+
+def _monthly_cash_flows(user, now=None):
+    """Net monthly cash flow (income minus spending) for every month up to now.
+
+    Income is the user's stated monthly income plus any expenses recorded in
+    an 'Income' category. Returns the flows and whether any income is known;
+    without it every month is a loss and the flows say nothing about saving
+    capacity.
+    """
+    stated = user.monthly_income
+    has_income = stated is not None
+    points = expense_points(user.id)
+    if not points:
+        return (np.array([stated]) if has_income else np.zeros(0)), has_income
+
+    income_ids = [cid for (cid,) in db.session.query(Category.id).filter(Category.name == "Income")]
+    dates, amounts, weights, category_ids = zip(*points)
+    month_index = np.array([d.year * 12 + d.month - 1 for d in dates])
+    is_income = np.isin(np.array(category_ids), income_ids)
+    signed = np.where(is_income, 1.0, -1.0) * np.array(amounts, dtype=float) * np.array(weights)
+
+    # Months without any activity, up to the current one, still count as (zero) observations
+    now = now or datetime.now()
+    offsets = month_index - month_index.min()
+    months = max(int(offsets.max()), now.year * 12 + now.month - 1 - int(month_index.min())) + 1
+    flows = np.bincount(offsets, weights=signed, minlength=months)
+    if has_income:
+        flows += stated
+    return flows, has_income or bool(is_income.any())
+
+def _months_left(deadline, now):
+    return max((deadline - now).days / 30, 1 / 30)
+
+def simulate_goal_outcomes(user, goals, n_paths=DEFAULT_SIMULATION_PATHS, seed=None, cash_flows=None):
+    """Monte Carlo estimate of hitting each goal's deadline.
+
+    Monthly cash-flow paths are bootstrapped from the user's own history and
+    shared by all goals, so the cost is one sampling pass regardless of how
+    many goals are passed in. A goal already met is certain and an overdue
+    one is lost; otherwise the probability is None when no income is known,
+    since spending alone cannot tell how much the user saves.
+    """
+    now = datetime.now()
+    goals = [g for g in goals if g.deadline is not None]
+    if not goals:
+        return {}
+
+    if cash_flows is None:
+        flows, has_income = _monthly_cash_flows(user, now)
+    else:
+        flows, has_income = np.asarray(cash_flows, dtype=float), True
+    months_left = np.array([_months_left(g.deadline, now) for g in goals])
+    remaining = np.array([max(g.target_amount - (g.current_amount or 0.0), 0.0) for g in goals])
+    horizons = np.ceil(months_left).astype(int)
+
+    if flows.size:
+        rng = np.random.default_rng(seed)
+        samples = rng.choice(flows, size=(n_paths, horizons.max()))
+        saved = samples.cumsum(axis=1)[:, horizons - 1]
+        probabilities = (saved >= remaining).mean(axis=0)
+        expected_saving = flows.mean()
+    else:
+        probabilities = (remaining <= 0).astype(float)
+        expected_saving = 0.0
+
+    overdue = np.array([g.deadline <= now for g in goals])
+    settled = (remaining <= 0) | overdue
+    probabilities = np.where(remaining <= 0, 1.0, np.where(overdue, 0.0, probabilities))
+
+    required = remaining / months_left
+    return {
+        goal.id: {
+            'probability': float(probabilities[i]) if has_income or settled[i] else None,
+            'required_monthly_saving': float(required[i]),
+            'expected_monthly_saving': float(expected_saving),
+            'months_left': float(months_left[i]),
+        }
+        for i, goal in enumerate(goals)
+    }
 
 def analyze_goal_feasibility(user, goal_amount, deadline):
     """Analyze if a financial goal is realistic based on spending patterns"""
-    monthly_income = sum(e.amount for e in user.expenses if e.category.name == "Income")
-    monthly_expenses = sum(e.amount for e in user.expenses if e.category.name != "Income")
-    savings_capacity = monthly_income - monthly_expenses
-    
-    months_to_goal = (deadline - datetime.now()).days / 30
+    flows, _ = _monthly_cash_flows(user)
+    savings_capacity = float(flows.mean()) if flows.size else 0.0
+
+    months_to_goal = _months_left(deadline, datetime.now())
     required_monthly_saving = goal_amount / months_to_goal
-    
+
     if required_monthly_saving > savings_capacity:
         return False, f"This goal might be challenging. You need to save ${required_monthly_saving:.2f} monthly, but your current saving capacity is ${savings_capacity:.2f}"
     return True, f"Goal looks achievable! Keep saving ${required_monthly_saving:.2f} monthly"
 
+def suggest_saving_strategies_for_goals(user, goals):
+    """Generate personalized saving strategies for all of a user's goals at once"""
+    largest = Expense.query.join(Category, Expense.category_id == Category.id).filter(
+        Expense.user_id == user.id,
+        Category.name != "Income"
+    ).order_by(Expense.amount.desc()).first()
+    if largest is None:
+        return {}
+    highest_category = largest.category
+    category_total = category_totals(user.id, category_id=highest_category.id).get(highest_category.id, 0.0)
+
+    outcomes = simulate_goal_outcomes(user, goals)
+    strategies = {}
+    for goal in goals:
+        outcome = outcomes.get(goal.id)
+        if outcome is None:
+            continue
+        if outcome['probability'] is None:
+            chance = "Add your monthly income above to see your chance of reaching this goal on time"
+        else:
+            chance = f"Chance of reaching this goal on time at your current pace: {outcome['probability'] * 100:.0f}%"
+        strategies[goal.id] = f"""Based on your spending patterns, here are personalized strategies to reach your {goal.name}:
+    1. Reduce {highest_category.name} expenses by 20% to save extra ${category_total * 0.2:.2f} monthly
+    2. Set up automatic transfers of ${outcome['required_monthly_saving']:.2f} monthly
+    3. Look for additional income opportunities in your field
+    {chance}"""
+    return strategies
+
 def suggest_saving_strategies(user, goal):
     """Generate personalized saving strategies"""
-    expenses = Expense.query.filter_by(user_id=user.id).all()
-    highest_category = max(expenses, key=lambda x: x.amount).category.name
-    
-    strategies = f"""Based on your spending patterns, here are personalized strategies to reach your {goal.name}:
-    1. Reduce {highest_category} expenses by 20% to save extra ${sum(e.amount for e in expenses if e.category.name == highest_category) * 0.2:.2f} monthly
-    2. Set up automatic transfers of ${goal.target_amount / (goal.deadline - datetime.now()).days * 30:.2f} monthly
-    3. Look for additional income opportunities in your field"""
-    
-    return strategies
+    return suggest_saving_strategies_for_goals(user, [goal]).get(goal.id)
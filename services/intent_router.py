@@ -0,0 +1,229 @@
+import logging
+import re
+import threading
+import time
+from datetime import datetime
+from models import Category, Expense
+from extensions import db
+from services.ai_service import (
+    analyze_expense_cause,
+    analyze_spending_patterns,
+    generate_saving_tip,
+    simulate_financial_scenario
+)
+from services.anomaly_detector import record_expense
+from services.expense_archive import category_totals
+from services.recurring_charges import subscriptions_summary, update_recurring_for_expense
+
+CATEGORY_REFRESH_SECONDS = 300
+
+# Extra words that point at a category, keyed by the category's own word
+CATEGORY_ALIASES = {
+    'food': ['groceries', 'grocery', 'restaurant', 'lunch', 'dinner', 'coffee', 'meal'],
+    'transportation': ['transport', 'uber', 'taxi', 'train', 'gas'],
+    'education': ['book', 'textbook', 'tuition', 'course'],
+    'entertainment': ['movie', 'concert', 'game', 'streaming'],
+    'utilities': ['phone', 'internet', 'electricity'],
+}
+
+AMOUNT_PATTERN = r'(?P<amount>\$?\d[\d,]*(?:\.\d+)?)'
+
+def _trie_pattern(words):
+    """Alternation of ``words`` factored into a prefix trie.
+
+    Alternatives at each node start with different characters, so the regex
+    engine never backtracks across words and always takes the longest term.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [
+            (r'\s+' if char == ' ' else re.escape(char)) + build(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            body = f'(?:{body})?' if len(branches) == 1 else body + '?'
+        return body
+
+    return build(trie) if trie else '(?!)'
+
+class IntentMatch:
+    """Everything the router extracted from one utterance"""
+
+    def __init__(self, text, intent, keywords, amounts, categories):
+        self.text = text
+        self.intent = intent
+        self.keywords = keywords
+        self.amounts = amounts
+        self.categories = categories  # [(category_id, category_name)] in order of mention
+
+    @property
+    def amount(self):
+        return self.amounts[0] if self.amounts else None
+
+    @property
+    def category(self):
+        return self.categories[0] if self.categories else None
+
+class IntentRouter:
+    """Single-pass intent and entity extraction shared by chat and voice.
+
+    Every intent keyword, category word and amount is an alternative of one
+    compiled, trie-factored regex, so an utterance is scanned once however
+    many intents are registered. Keywords match at word starts ('save' also matches 'savings').
+    When several intents match, the lowest priority number wins.
+    """
+
+    def __init__(self):
+        self._intents = {}
+        self._order = 0
+        self._lock = threading.Lock()
+        self._compiled = None
+        self._categories = None
+        self._categories_loaded = 0.0
+        self._pinned_categories = None
+
+    def intent(self, name, keywords, priority=100):
+        """Decorator registering ``handler(match, user) -> str`` for ``keywords``"""
+        def decorator(handler):
+            with self._lock:
+                self._order += 1
+                self._intents[name] = ((priority, self._order), [k.lower() for k in keywords], handler)
+                self._compiled = None
+            return handler
+        return decorator
+
+    def pin_categories(self, rows):
+        """Use fixed (id, name) category rows instead of the database (benchmarks, scripts)"""
+        with self._lock:
+            self._pinned_categories = tuple(rows)
+            self._compiled = None
+
+    def _category_rows(self):
+        if self._pinned_categories is not None:
+            return self._pinned_categories
+        now = time.monotonic()
+        if self._categories is None or now - self._categories_loaded > CATEGORY_REFRESH_SECONDS:
+            self._categories = tuple(db.session.query(Category.id, Category.name).order_by(Category.id))
+            self._categories_loaded = now
+        return self._categories
+
+    def _build(self, categories):
+        terms = {}
+        for name, (_, keywords, _) in self._intents.items():
+            for keyword in keywords:
+                terms.setdefault(keyword, [None, None])[0] = name
+        for category_id, category_name in categories:
+            words = re.findall(r'[a-z]+', category_name.lower())
+            for word in words[:1] + CATEGORY_ALIASES.get(words[0] if words else '', []):
+                entry = terms.setdefault(word, [None, None])
+                if entry[1] is None:
+                    entry[1] = (category_id, category_name)
+        # Anchoring every alternative at a word start lets the scanner skip mid-word positions
+        pattern = re.compile(rf'(?<![\w$])(?:(?P<term>{_trie_pattern(terms)})\w*|{AMOUNT_PATTERN})')
+        return categories, pattern, terms
+
+    def _matcher(self):
+        categories = self._category_rows()
+        compiled = self._compiled
+        if compiled is None or compiled[0] is not categories:
+            with self._lock:
+                compiled = self._compiled = self._build(categories)
+        return compiled
+
+    def parse(self, text):
+        _, pattern, terms = self._matcher()
+        text = (text or '').lower()
+        keywords, amounts, categories = [], [], []
+        best = best_rank = None
+        for term, amount in pattern.findall(text):
+            if amount:
+                try:
+                    amounts.append(float(amount.lstrip('$').replace(',', '')))
+                except ValueError:
+                    pass
+                continue
+            entry = terms.get(term) or terms[' '.join(term.split())]
+            intent_name, category = entry
+            if intent_name is not None:
+                keywords.append(term)
+                rank = self._intents[intent_name][0]
+                if best is None or rank < best_rank:
+                    best, best_rank = intent_name, rank
+            if category is not None and category not in categories:
+                categories.append(category)
+        return IntentMatch(text, best, keywords, amounts, categories)
+
+    def dispatch(self, text, user, default):
+        """Run the matched intent's handler, or ``default(match, user)`` when none matched"""
+        match = self.parse(text)
+        handler = self._intents[match.intent][2] if match.intent else default
+        return handler(match, user)
+
+router = IntentRouter()
+
+# Built-in intents. Register more with @router.intent from any module.
+
+@router.intent('add_expense', ['add expense', 'add an expense', 'log expense', 'record expense'], priority=10)
+def _add_expense(match, user):
+    if match.amount is None or match.category is None:
+        return "Tell me the amount and the category, for example 'add expense 12 dollars for food'"
+    category_id, category_name = match.category
+    expense = Expense(amount=match.amount, category_id=category_id, description=match.text[:256],
+                      user_id=user.id, date=datetime.now())
+    db.session.add(expense)
+    db.session.flush()
+    record_expense(expense)
+    update_recurring_for_expense(expense)
+    db.session.commit()
+    logging.info(f"Added expense {expense.id} from an intent for user {user.id}")
+    return f"Added ${match.amount:.2f} expense for {category_name}"
+
+@router.intent('budget_summary', ['budget summary', 'spending summary'], priority=20)
+def _budget_summary(match, user):
+    total_spent = sum(category_totals(user.id).values())
+    return f"Your total spending is ${total_spent:.2f}. Would you like a detailed breakdown?"
+
+@router.intent('financial_advice', ['financial advice'], priority=30)
+def _financial_advice(match, user):
+    return analyze_spending_patterns(user)
+
+@router.intent('budget', ['budget', 'plan', 'allocate'], priority=40)
+def _budget(match, user):
+    return analyze_spending_patterns(user)
+
+@router.intent('saving', ['save', 'saving', 'savings', 'tips'], priority=50)
+def _saving(match, user):
+    return generate_saving_tip()
+
+@router.intent('investment', ['invest', 'investment', 'stock', 'future'], priority=60)
+def _investment(match, user):
+    return simulate_financial_scenario("investment advice " + match.text, user)
+
+@router.intent('debt', ['debt', 'loan', 'credit'], priority=70)
+def _debt(match, user):
+    return simulate_financial_scenario("debt management " + match.text, user)
+
+@router.intent('income', ['earn', 'job', 'income', 'work'], priority=80)
+def _income(match, user):
+    return simulate_financial_scenario("income opportunities " + match.text, user)
+
+@router.intent('emergency_fund', ['emergency', 'fund', 'safety'], priority=90)
+def _emergency_fund(match, user):
+    return simulate_financial_scenario("emergency fund " + match.text, user)
+
+@router.intent('subscriptions', ['subscription', 'recurring', 'netflix', 'spotify'], priority=100)
+def _subscriptions(match, user):
+    return subscriptions_summary(user.id)
+
+@router.intent('overspending', ['overspend', 'overspent', 'spent', 'spending'], priority=110)
+def _overspending(match, user):
+    return analyze_expense_cause(user)
@@ -0,0 +1,228 @@
+import json
+import logging
+import os
+import random
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from flask import g, request
+
+# Profiling is off unless an endpoint is listed here or a request asks for it
+PROFILE_ENDPOINTS = {e.strip() for e in os.environ.get("PROFILE_ENDPOINTS", "").split(",") if e.strip()}
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0.05))  # Share of listed requests profiled
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL_MS", 5)) / 1000
+PROFILE_FLUSH_EVERY = int(os.environ.get("PROFILE_FLUSH_EVERY", 20))
+PROFILE_HEADER = 'X-Profile'
+MAX_STACK_DEPTH = 128
+
+# Where the time went, judged by the frames on each sampled stack (first match wins)
+TIME_BUCKETS = (
+    ('provider', ('openai/', 'anthropic/', 'httpx/', 'httpcore/', 'speech_recognition/', 'pyttsx3/')),
+    ('sql', ('sqlalchemy/', 'sqlite3/', 'psycopg2/', 'psycopg/')),
+    ('numeric', ('numpy/', 'sklearn/', 'scipy/', 'pandas/')),
+    ('templates', ('jinja2/',)),
+)
+
+_ROOTS = sorted(
+    {os.path.dirname(os.path.dirname(os.path.abspath(__file__))), *sysconfig.get_paths().values(), *sys.path},
+    key=len, reverse=True
+)
+_labels = {}
+
+def _label(code):
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        for root in _ROOTS:
+            if root and path.startswith(root + os.sep):
+                path = path[len(root) + 1:]
+                break
+        label = _labels[code] = f"{code.co_name} ({path}:{code.co_firstlineno})"
+    return label
+
+def _stack(frame):
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return tuple(labels)
+
+class StackSampler:
+    """Samples the Python stacks of registered threads from one background thread.
+
+    The sampler only runs while at least one thread is registered, so
+    requests that are not profiled pay nothing. Under gevent workers only
+    OS threads are visible; profile with gthread workers or the CLI.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._targets = {}
+        self._thread = None
+
+    def start(self, ident):
+        with self._lock:
+            self._targets[ident] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+
+    def stop(self, ident):
+        with self._lock:
+            return self._targets.pop(ident, Counter())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._targets:
+                    self._thread = None
+                    return
+                frames = sys._current_frames()
+                for ident, stacks in self._targets.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[_stack(frame)] += 1
+            time.sleep(self.interval)
+
+def to_collapsed(stacks):
+    """Brendan Gregg's folded format, for flamegraph.pl, inferno or speedscope"""
+    return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common())
+
+def to_speedscope(stacks, name, interval=PROFILE_INTERVAL):
+    frames, index = [], {}
+    samples, weights = [], []
+    for stack, count in stacks.most_common():
+        sample = []
+        for label in stack:
+            if label not in index:
+                index[label] = len(frames)
+                frames.append({'name': label})
+            sample.append(index[label])
+        samples.append(sample)
+        weights.append(count * interval * 1000)
+    return json.dumps({
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled', 'name': name, 'unit': 'milliseconds',
+            'startValue': 0, 'endValue': sum(weights), 'samples': samples, 'weights': weights,
+        }],
+        'name': name,
+        'exporter': 'cashai',
+    })
+
+PROFILE_FORMATS = {'collapsed': ('.collapsed', to_collapsed), 'speedscope': ('.speedscope.json', to_speedscope)}
+
+def render_profile(stacks, fmt, name='profile', interval=PROFILE_INTERVAL):
+    if fmt not in PROFILE_FORMATS:
+        raise ValueError(f"Unknown profile format '{fmt}' (expected one of {', '.join(PROFILE_FORMATS)})")
+    if fmt == 'speedscope':
+        return to_speedscope(stacks, name, interval)
+    return to_collapsed(stacks)
+
+def time_breakdown(stacks):
+    """Share of samples spent in provider calls, SQL, numeric code, templates and other Python"""
+    buckets = Counter()
+    for stack, count in stacks.items():
+        joined = ' '.join(stack)
+        bucket = next((name for name, markers in TIME_BUCKETS if any(m in joined for m in markers)), 'python')
+        buckets[bucket] += count
+    total = sum(buckets.values()) or 1
+    return {name: buckets[name] / total for name in [b for b, _ in TIME_BUCKETS] + ['python']}
+
+def top_functions(stacks, limit=15):
+    """Functions ranked by self samples (the leaf of each stack)"""
+    leaves = Counter()
+    for stack, count in stacks.items():
+        if stack:
+            leaves[stack[-1]] += count
+    return leaves.most_common(limit)
+
+class RequestProfiler:
+    """Per-endpoint aggregation of sampled request profiles, written under ``output_dir``"""
+
+    def __init__(self, output_dir, endpoints=PROFILE_ENDPOINTS, sample_rate=PROFILE_SAMPLE_RATE,
+                 interval=PROFILE_INTERVAL, flush_every=PROFILE_FLUSH_EVERY):
+        self.output_dir = output_dir
+        self.endpoints = set(endpoints)
+        self.sample_rate = sample_rate
+        self.flush_every = flush_every
+        self.sampler = StackSampler(interval)
+        self._lock = threading.Lock()
+        self._aggregates = {}
+        self._pending = Counter()
+
+    def wants(self, endpoint):
+        return endpoint in self.endpoints and random.random() < self.sample_rate
+
+    def record(self, endpoint, stacks):
+        with self._lock:
+            self._aggregates.setdefault(endpoint, Counter()).update(stacks)
+            self._pending[endpoint] += 1
+            flush = self._pending[endpoint] >= self.flush_every
+            if flush:
+                self._pending[endpoint] = 0
+        if flush:
+            self.flush(endpoint)
+
+    def aggregate(self, endpoint):
+        with self._lock:
+            return Counter(self._aggregates.get(endpoint, ()))
+
+    def write(self, stacks, basename):
+        """Write ``stacks`` in every format and return the written paths"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        paths = []
+        for fmt, (suffix, _) in PROFILE_FORMATS.items():
+            path = os.path.join(self.output_dir, basename + suffix)
+            with open(path, 'w', encoding='utf-8') as out:
+                out.write(render_profile(stacks, fmt, basename, self.sampler.interval))
+            paths.append(path)
+        return paths
+
+    def flush(self, endpoint):
+        try:
+            self.write(self.aggregate(endpoint), f"{endpoint}-{os.getpid()}")
+        except OSError as e:
+            logging.error(f"Could not write profile for {endpoint}: {str(e)}")
+
+def init_profiling(app, authorize):
+    """Profile listed endpoints at PROFILE_SAMPLE_RATE, and any request sent with
+    ``X-Profile: 1`` by a caller ``authorize()`` accepts (its profile is also
+    written on its own and named in the ``X-Profile-File`` response header).
+    """
+    output_dir = os.environ.get("PROFILE_DIR") or os.path.join(app.instance_path, 'profiles')
+    profiler = app.extensions['profiler'] = RequestProfiler(output_dir)
+
+    @app.before_request
+    def _start_profile():
+        forced = request.headers.get(PROFILE_HEADER) == '1' and authorize()
+        if forced or profiler.wants(request.endpoint):
+            g._profile = (threading.get_ident(), forced)
+            profiler.sampler.start(threading.get_ident())
+
+    def _finish(response=None):
+        profile = g.pop('_profile', None)
+        if profile is None:
+            return
+        ident, forced = profile
+        stacks = profiler.sampler.stop(ident)
+        profiler.record(request.endpoint, stacks)
+        if forced and response is not None:
+            paths = profiler.write(stacks, f"{request.endpoint}-{int(time.time() * 1000)}")
+            response.headers['X-Profile-File'] = os.path.basename(paths[-1])
+
+    @app.after_request
+    def _stop_profile(response):
+        _finish(response)
+        return response
+
+    @app.teardown_request
+    def _stop_profile_on_error(exc):
+        _finish()
+
+    return profiler
@@ -0,0 +1,258 @@
+import logging
+import re
+from functools import lru_cache
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from models import Expense, RecurringCharge
+from extensions import db
+
+MIN_OCCURRENCES = 3
+MAX_INTERVAL_CV = 0.25  # Spread of the gaps between charges, relative to the mean gap
+MAX_AMOUNT_CV = 0.2
+MIN_PERIOD_DAYS = 5
+MAX_PERIOD_DAYS = 400
+PERIOD_ALPHA = 0.3  # Weight of the newest gap when a known charge recurs
+# Well-known billing cycles; detected periods within 15% snap to them
+CANONICAL_PERIODS = np.array([7.0, 14.0, 30.44, 91.31, 182.62, 365.25])
+LOOKBACK_DAYS = 400
+EPOCH = datetime(1970, 1, 1)
+
+@lru_cache(maxsize=65536)
+def normalize_description(description):
+    """Merchant key: lowercase words only, so 'Spotify #1234' and 'SPOTIFY' match"""
+    words = re.findall(r'[a-z]+', (description or '').lower())
+    return ' '.join(words)[:128]
+
+def amount_band(amount):
+    """Whole-dollar band a charge amount belongs to.
+
+    Series are split by merchant and band, so a fixed subscription is not
+    mixed up with variable purchases from the same merchant.
+    """
+    return int(np.floor(amount + 0.5))
+
+def _to_days(dates):
+    """Naive datetimes to fractional days since the epoch, in one vectorized pass"""
+    return np.array(dates, dtype='datetime64[us]').astype(np.int64) / 86400e6
+
+def _from_days(days):
+    return EPOCH + timedelta(days=float(days))
+
+def _snap(periods):
+    distance = np.abs(periods[:, None] - CANONICAL_PERIODS[None, :]) / CANONICAL_PERIODS[None, :]
+    nearest = distance.argmin(axis=1)
+    return np.where(distance[np.arange(len(periods)), nearest] <= 0.15, CANONICAL_PERIODS[nearest], periods)
+
+def detect_periodicity(groups, days, amounts, n_groups):
+    """Vectorized period analysis for many (user, merchant) series at once.
+
+    ``groups``/``days``/``amounts`` must be sorted by group, then time. Every
+    step is a fixed number of whole-array passes, so the cost is linear in
+    the number of rows. Returns a dict of per-group arrays.
+    """
+    counts = np.bincount(groups, minlength=n_groups)
+    last_index = np.cumsum(counts) - 1
+
+    same_group = groups[1:] == groups[:-1]
+    gaps = np.diff(days)[same_group]
+    gap_groups = groups[1:][same_group]
+    gap_counts = np.bincount(gap_groups, minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gap_mean = np.bincount(gap_groups, weights=gaps, minlength=n_groups) / gap_counts
+        gap_var = np.bincount(gap_groups, weights=gaps ** 2, minlength=n_groups) / gap_counts - gap_mean ** 2
+        interval_cv = np.sqrt(np.maximum(gap_var, 0)) / gap_mean
+
+        amount_mean = np.bincount(groups, weights=amounts, minlength=n_groups) / counts
+        amount_var = np.bincount(groups, weights=amounts ** 2, minlength=n_groups) / counts - amount_mean ** 2
+        amount_cv = np.sqrt(np.maximum(amount_var, 0)) / amount_mean
+
+    recurring = (
+        (counts >= MIN_OCCURRENCES)
+        & (interval_cv <= MAX_INTERVAL_CV)
+        & (amount_cv <= MAX_AMOUNT_CV)
+        & (gap_mean >= MIN_PERIOD_DAYS)
+        & (gap_mean <= MAX_PERIOD_DAYS)
+    )
+    period = np.where(recurring, _snap(np.nan_to_num(gap_mean)), 0.0)
+    confidence = np.clip((1 - interval_cv / MAX_INTERVAL_CV) * np.minimum(counts / 6, 1.0), 0, 1)
+    last_safe = np.maximum(last_index, 0)
+    return {
+        'recurring': recurring,
+        'period': period,
+        'amount': np.where(counts > 0, amounts[last_safe] if len(amounts) else 0.0, 0.0),
+        'last_day': days[last_safe] if len(days) else np.zeros(n_groups),
+        'last_row': last_safe,
+        'occurrences': counts,
+        'confidence': np.nan_to_num(confidence),
+    }
+
+def _charge_rows(result, keys, meta, now_day):
+    rows = []
+    for g in np.nonzero(result['recurring'])[0]:
+        user_id, merchant_key = keys[g]
+        category_id, description = meta[result['last_row'][g]]
+        last_day = float(result['last_day'][g])
+        period = float(result['period'][g])
+        rows.append({
+            'user_id': user_id,
+            'category_id': category_id,
+            'merchant_key': merchant_key,
+            'description': description,
+            'amount': float(result['amount'][g]),
+            'period_days': period,
+            'occurrences': int(result['occurrences'][g]),
+            'last_date': _from_days(last_day),
+            'next_expected_date': _from_days(last_day + period),
+            # A charge that is more than half a cycle overdue has probably been cancelled
+            'active': now_day <= last_day + period * 1.5,
+            'confidence': float(result['confidence'][g]),
+        })
+    return rows
+
+class _Reordered:
+    def __init__(self, items, order):
+        self.items, self.order = items, order
+
+    def __getitem__(self, index):
+        return self.items[self.order[index]]
+
+def detect_recurring_charges(user_id=None):
+    """Batch job: rebuild the recurring-charge index from recent expenses"""
+    since = datetime.now() - timedelta(days=LOOKBACK_DAYS)
+    stmt = select(Expense.user_id, Expense.category_id, Expense.description, Expense.amount, Expense.date).where(
+        Expense.date >= since
+    )
+    if user_id is not None:
+        stmt = stmt.where(Expense.user_id == user_id)
+
+    key_ids, keys = {}, []
+    group_list, date_list, amount_list, meta = [], [], [], []
+    for row_user_id, category_id, description, amount, date in db.session.execute(
+        stmt.execution_options(yield_per=10000)
+    ):
+        merchant_key = normalize_description(description)
+        if not merchant_key:
+            continue
+        group = key_ids.setdefault((row_user_id, merchant_key, amount_band(amount)), len(key_ids))
+        if group == len(keys):
+            keys.append((row_user_id, merchant_key))
+        group_list.append(group)
+        date_list.append(date)
+        amount_list.append(amount)
+        meta.append((category_id, description))
+
+    if user_id is None:
+        db.session.execute(delete(RecurringCharge))
+    else:
+        db.session.execute(delete(RecurringCharge).where(RecurringCharge.user_id == user_id))
+
+    if group_list:
+        groups = np.array(group_list, dtype=np.int64)
+        days = _to_days(date_list)
+        order = np.lexsort((days, groups))
+        result = detect_periodicity(groups[order], days[order], np.array(amount_list)[order], len(keys))
+        # Only the last row of each group is ever looked up, so map indices instead of reordering meta
+        rows = _charge_rows(result, keys, _Reordered(meta, order), _to_days([datetime.now()])[0])
+        # One charge per merchant: when several bands recur, keep the most recently billed
+        latest = {}
+        for row in rows:
+            key = (row['user_id'], row['merchant_key'])
+            if key not in latest or (row['last_date'], row['occurrences']) > (latest[key]['last_date'], latest[key]['occurrences']):
+                latest[key] = row
+        rows = list(latest.values())
+        if rows:
+            db.session.execute(insert(RecurringCharge), rows)
+    else:
+        rows = []
+    db.session.commit()
+    logging.info(f"Detected {len(rows)} recurring charges")
+    return len(rows)
+
+def update_recurring_for_expense(expense):
+    """Incremental update for one new expense (call before commit).
+
+    A known charge billed again in the same amount band has its cadence and
+    next date refreshed in O(1); otherwise only the user's recent expenses
+    with the same merchant and amount band are examined, as in the batch job.
+    """
+    merchant_key = normalize_description(expense.description)
+    if not merchant_key:
+        return None
+    charge = RecurringCharge.query.filter_by(user_id=expense.user_id, merchant_key=merchant_key).first()
+
+    band = amount_band(expense.amount)
+    if charge is not None and amount_band(charge.amount) == band:
+        gap = (expense.date - charge.last_date).total_seconds() / 86400
+        if gap >= charge.period_days * 0.5:
+            charge.period_days = float(_snap(np.array([
+                (1 - PERIOD_ALPHA) * charge.period_days + PERIOD_ALPHA * gap
+            ]))[0])
+            charge.amount = expense.amount
+            charge.description = expense.description
+            charge.occurrences += 1
+            charge.last_date = expense.date
+            charge.next_expected_date = expense.date + timedelta(days=charge.period_days)
+            charge.active = True
+        return charge
+
+    # Every word of the merchant key occurs in the lowercased description, so
+    # this narrows to the merchant before the cap; the exact check is below.
+    words = [Expense.description.ilike(f'%{word}%') for word in merchant_key.split()]
+    candidates = Expense.query.filter(
+        Expense.user_id == expense.user_id,
+        Expense.category_id == expense.category_id,
+        Expense.date >= expense.date - timedelta(days=LOOKBACK_DAYS),
+        Expense.amount >= band - 0.5,
+        Expense.amount < band + 0.5,
+        *words
+    ).order_by(Expense.date.desc()).limit(200).all()
+    series = [e for e in candidates if normalize_description(e.description) == merchant_key]
+    if expense not in series:
+        series.append(expense)
+    if len(series) < MIN_OCCURRENCES:
+        return None
+
+    series.sort(key=lambda e: e.date)
+    days = _to_days([e.date for e in series])
+    result = detect_periodicity(np.zeros(len(series), dtype=np.int64), days, np.array([e.amount for e in series]), 1)
+    rows = _charge_rows(result, [(expense.user_id, merchant_key)], [(e.category_id, e.description) for e in series],
+                        _to_days([datetime.now()])[0])
+    if not rows:
+        return None
+    if charge is None:
+        try:
+            with db.session.begin_nested():
+                charge = RecurringCharge(**rows[0])
+                db.session.add(charge)
+            return charge
+        except IntegrityError:
+            # A concurrent request detected the same charge first; refresh that row instead
+            charge = RecurringCharge.query.filter_by(user_id=expense.user_id, merchant_key=merchant_key).one()
+    for field, value in rows[0].items():
+        setattr(charge, field, value)
+    return charge
+
+def upcoming_charges(user_id, days=30):
+    """Active recurring charges expected within the next ``days`` days"""
+    horizon = datetime.now() + timedelta(days=days)
+    return RecurringCharge.query.filter(
+        RecurringCharge.user_id == user_id,
+        RecurringCharge.active.is_(True),
+        RecurringCharge.next_expected_date <= horizon
+    ).order_by(RecurringCharge.next_expected_date).all()
+
+def subscriptions_summary(user_id):
+    """Chat-ready summary of a user's detected subscriptions"""
+    charges = RecurringCharge.query.filter_by(user_id=user_id, active=True).order_by(RecurringCharge.amount.desc()).all()
+    if not charges:
+        return "🔁 I haven't spotted any recurring charges in your recent expenses."
+    monthly = sum(c.amount * 30.44 / c.period_days for c in charges)
+    lines = [f"🔁 **Recurring charges: about ${monthly:.2f}/month**"]
+    for charge in charges:
+        lines.append(
+            f"• {charge.description or charge.merchant_key}: **${charge.amount:.2f}** every "
+            f"{charge.period_days:.0f} days, next around {charge.next_expected_date:%b %d}"
+        )
+    return "\n".join(lines)
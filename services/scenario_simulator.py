@@ -0,0 +1,276 @@
+import re
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import func
+from models import Budget, Category, FinancialGoal
+from extensions import db
+from services.expense_archive import category_totals
+
+# Annual return assumptions used when the user does not name a rate
+INVESTMENT_RATE_SCENARIOS = {
+    'Conservative': 0.04,
+    'Moderate': 0.07,
+    'Aggressive': 0.10,
+}
+DEFAULT_LOAN_RATE = 0.065
+DEFAULT_PART_TIME_INCOME = 400.0
+EMERGENCY_FUND_MONTHS = 3
+PROFILE_WINDOW_DAYS = 90
+
+def user_financial_profile(user):
+    """Aggregate the numbers every scenario is parameterized from in a few SQL sums"""
+    since = datetime.now() - timedelta(days=PROFILE_WINDOW_DAYS)
+    months = PROFILE_WINDOW_DAYS / 30
+
+    income_ids = {cid for (cid,) in db.session.query(Category.id).filter(Category.name == "Income")}
+    totals = category_totals(user.id, since=since)
+    earned = sum(amount for cid, amount in totals.items() if cid in income_ids)
+    spent = sum(totals.values()) - earned
+
+    budgets = dict(db.session.query(Category.name, Budget.amount).join(
+        Budget, Budget.category_id == Category.id
+    ).filter(Budget.user_id == user.id).all())
+
+    savings = db.session.query(func.coalesce(func.sum(FinancialGoal.current_amount), 0.0)).filter(
+        FinancialGoal.user_id == user.id
+    ).scalar()
+
+    monthly_expenses = spent / months
+    monthly_income = earned / months + (user.monthly_income or 0.0)
+    return {
+        'monthly_expenses': monthly_expenses,
+        'monthly_income': monthly_income,
+        'monthly_surplus': monthly_income - monthly_expenses,
+        'monthly_budget': sum(budgets.values()),
+        'budgets': budgets,
+        'savings': savings,
+    }
+
+def project_investment(principal, monthly_contribution, annual_rates, months):
+    """Month-end balances for each annual rate, shape (len(annual_rates), months)"""
+    rates = np.atleast_1d(np.asarray(annual_rates, dtype=float)) / 12
+    t = np.arange(1, months + 1)
+    growth = (1 + rates[:, None]) ** t
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annuity = np.where(rates[:, None] == 0, t, (growth - 1) / rates[:, None])
+    return principal * growth + monthly_contribution * annuity
+
+def amortize_loan(balance, annual_rate, monthly_payments):
+    """Months to payoff and total interest for each candidate monthly payment"""
+    payments = np.atleast_1d(np.asarray(monthly_payments, dtype=float))
+    rate = annual_rate / 12
+    if rate == 0:
+        months = balance / payments
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            months = -np.log(1 - rate * balance / payments) / np.log(1 + rate)
+        # A payment that does not cover the interest never pays the loan off
+        months = np.where(payments > rate * balance, months, np.inf)
+    interest = np.where(np.isfinite(months), payments * months - balance, np.inf)
+    return np.ceil(months), np.maximum(interest, 0)
+
+def emergency_fund_runway(savings, monthly_expenses, monthly_saving, target_months=EMERGENCY_FUND_MONTHS, target=None):
+    """Runway in months today and how long it takes to reach the target cushion.
+
+    The cushion is ``target_months`` of spending unless an explicit ``target`` is given.
+    """
+    runway = savings / monthly_expenses if monthly_expenses > 0 else np.inf
+    if target is None:
+        target = target_months * monthly_expenses
+    gap = max(target - savings, 0.0)
+    if gap == 0:
+        months_to_target = 0.0
+    elif monthly_saving > 0:
+        months_to_target = np.ceil(gap / monthly_saving)
+    else:
+        months_to_target = np.inf
+    return runway, target, months_to_target
+
+AMOUNT_RE = re.compile(
+    r'\$?(?P<value>\d[\d,]*(?:\.\d+)?)(?P<thousands>k\b)?'
+    r'(?![\d,.]*(?:\d|\s*%|\s*(?:years?|yrs?|months?|mos?)\b))'
+    r'(?P<monthly>\s*(?:/\s*mo(?:nth)?\b|(?:per|a|an|each|every)\s+month\b|monthly\b))?'
+)
+
+def _amounts(text, monthly=None):
+    """Dollar amounts in ``text``, skipping rates and durations.
+
+    ``monthly=True`` keeps only recurring amounts ("$200 a month", "150/mo",
+    "50 monthly"), ``monthly=False`` only lump sums.
+
+    >>> _amounts("invest $200 monthly for 10 years")
+    [200.0]
+    >>> _amounts("pay off $3000 loan paying 150 monthly at 6%")
+    [3000.0, 150.0]
+    >>> _amounts("save 1,200 over 6 months, 2 yrs or 18 mo")
+    [1200.0]
+    >>> _amounts("should i invest $5000 in an index fund", monthly=True)
+    []
+    >>> _amounts("should i invest $5000 in an index fund", monthly=False)
+    [5000.0]
+    >>> _amounts("put $10k down and add $250 a month", monthly=True)
+    [250.0]
+    >>> _amounts("i want a safety net of $2.5k")
+    [2500.0]
+    """
+    amounts = []
+    for match in AMOUNT_RE.finditer(text):
+        if monthly is not None and bool(match.group('monthly')) != monthly:
+            continue
+        value = float(match.group('value').replace(',', ''))
+        amounts.append(value * 1000 if match.group('thousands') else value)
+    return amounts
+
+def _rate(text):
+    match = re.search(r'(\d+(?:\.\d+)?)\s*%', text)
+    return float(match.group(1)) / 100 if match else None
+
+def _years(text, default):
+    match = re.search(r'(\d+(?:\.\d+)?)\s*(?:years?|yrs?)', text)
+    return float(match.group(1)) if match else default
+
+def _format_months(months):
+    if not np.isfinite(months):
+        return "never at this rate"
+    years, rest = divmod(int(months), 12)
+    if years:
+        return f"{years} yr {rest} mo" if rest else f"{years} yr"
+    return f"{rest} mo"
+
+# Prefixes the chat route puts in front of the user's message
+SCENARIO_PREFIXES = {
+    'investment': 'investment advice',
+    'debt': 'debt management',
+    'income': 'income opportunities',
+    'emergency': 'emergency fund',
+}
+
+def scenario_kind(description):
+    """Map the chat route's scenario prefix (or free text) to a simulator"""
+    text = description.lower()
+    for kind, prefix in SCENARIO_PREFIXES.items():
+        if text.startswith(prefix):
+            return kind
+    for kind, words in (
+        ('investment', ('invest', 'stock', 'future')),
+        ('debt', ('debt', 'loan', 'credit')),
+        ('income', ('earn', 'job', 'income', 'work')),
+        ('emergency', ('emergency', 'fund', 'safety')),
+    ):
+        if any(word in text for word in words):
+            return kind
+    return None
+
+def _investment(text, profile):
+    """
+    >>> profile = {'monthly_surplus': 0.0}
+    >>> _investment("should i invest $5000 in an index fund", profile).splitlines()[:2]
+    ['📈 **Investing $5000.00 for 5 years**', '• Total contributed: **$5000.00**']
+    """
+    contributions = _amounts(text, monthly=True)
+    lump_sums = _amounts(text, monthly=False)
+    principal = lump_sums[0] if lump_sums else 0.0
+    if contributions:
+        contribution = contributions[0]
+    else:
+        # A lone lump sum is invested once; with no amount at all, assume a modest monthly habit
+        contribution = 0.0 if principal else max(profile['monthly_surplus'], 50.0)
+    years = _years(text, 5)
+    rate = _rate(text)
+    scenarios = {'Your rate': rate} if rate is not None else INVESTMENT_RATE_SCENARIOS
+
+    months = max(int(round(years * 12)), 1)
+    balances = project_investment(principal, contribution, list(scenarios.values()), months)
+    invested = principal + contribution * months
+
+    if contribution:
+        lines = [f"📈 **Investing ${contribution:.2f}/month for {years:g} years**"]
+        if principal:
+            lines[0] += f" (starting with **${principal:.2f}**)"
+    else:
+        lines = [f"📈 **Investing ${principal:.2f} for {years:g} years**"]
+    lines.append(f"• Total contributed: **${invested:.2f}**")
+    for (label, annual_rate), final in zip(scenarios.items(), balances[:, -1]):
+        lines.append(f"• {label} ({annual_rate * 100:.1f}%/yr): **${final:.2f}** (growth **${final - invested:.2f}**)")
+    return "\n".join(lines)
+
+def _debt(text, profile):
+    balances = _amounts(text, monthly=False)
+    payments = _amounts(text, monthly=True)
+    balance = balances[0] if balances else None
+    if not balance:
+        return None
+    rate = _rate(text)
+    rate = DEFAULT_LOAN_RATE if rate is None else rate
+    if payments:
+        payment = payments[0]
+    else:
+        payment = balances[1] if len(balances) > 1 else max(balance * 0.02, 25.0)
+    payments = np.array([payment, payment + 50, payment + 100])
+    months, interest = amortize_loan(balance, rate, payments)
+
+    lines = [f"💳 **Paying off ${balance:.2f} at {rate * 100:.1f}%/yr**"]
+    for p, m, i in zip(payments, months, interest):
+        if np.isfinite(m):
+            lines.append(f"• ${p:.2f}/month: paid off in **{_format_months(m)}**, total interest **${i:.2f}**")
+        else:
+            lines.append(f"• ${p:.2f}/month: does not cover the interest, balance keeps growing")
+    return "\n".join(lines)
+
+def _income(text, profile):
+    amounts = _amounts(text)
+    extra = amounts[0] if amounts else DEFAULT_PART_TIME_INCOME
+    new_surplus = profile['monthly_surplus'] + extra
+    saved = project_investment(0.0, max(new_surplus, 0.0), [0.0, INVESTMENT_RATE_SCENARIOS['Conservative']], 12)[:, -1]
+
+    lines = [f"💼 **Earning an extra ${extra:.2f}/month**"]
+    lines.append(f"• Monthly surplus goes from **${profile['monthly_surplus']:.2f}** to **${new_surplus:.2f}**")
+    if new_surplus > 0:
+        lines.append(f"• Saved after 12 months: **${saved[0]:.2f}** (or **${saved[1]:.2f}** in a 4% savings account)")
+    else:
+        lines.append("• Spending still exceeds income, so trimming expenses has to come first")
+    return "\n".join(lines)
+
+def _emergency(text, profile):
+    """
+    >>> profile = {'monthly_surplus': 100.0, 'savings': 500.0, 'monthly_expenses': 800.0}
+    >>> _emergency("i want a safety net of $2000", profile).splitlines()[2:]
+    ['• Your target cushion: **$2000.00**', '• Saving $100.00/month gets you there in **1 yr 3 mo**']
+    """
+    savings = _amounts(text, monthly=True)
+    targets = _amounts(text, monthly=False)
+    monthly_saving = savings[0] if savings else max(profile['monthly_surplus'], 0.0)
+    target = targets[0] if targets else None
+    runway, target, months_to_target = emergency_fund_runway(
+        profile['savings'], profile['monthly_expenses'], monthly_saving, target=target
+    )
+
+    lines = ["🛟 **Emergency fund check**"]
+    if np.isfinite(runway):
+        lines.append(f"• Current savings of **${profile['savings']:.2f}** cover **{runway:.1f} months** of spending")
+    if targets:
+        lines.append(f"• Your target cushion: **${target:.2f}**")
+    else:
+        lines.append(f"• {EMERGENCY_FUND_MONTHS}-month cushion: **${target:.2f}**")
+    if months_to_target == 0:
+        lines.append("• You already have a full cushion")
+    elif monthly_saving > 0:
+        lines.append(f"• Saving ${monthly_saving:.2f}/month gets you there in **{_format_months(months_to_target)}**")
+    else:
+        lines.append("• Set aside even $25/month to start building the cushion")
+    return "\n".join(lines)
+
+SIMULATORS = {
+    'investment': _investment,
+    'debt': _debt,
+    'income': _income,
+    'emergency': _emergency,
+}
+
+def run_scenario(description, user):
+    """Deterministic projection for a chat scenario, or None if nothing can be computed"""
+    kind = scenario_kind(description)
+    if kind is None:
+        return None, None
+    profile = user_financial_profile(user)
+    return SIMULATORS[kind](description.lower(), profile), profile
@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesce identical concurrent calls into one and briefly reuse the result.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait for and share its outcome (including its exception).
+    Successful results are served from memory for ``reuse_seconds`` afterwards.
+    An optional ``admit()`` passed to ``do`` gates new upstream calls only; it
+    must not block, a call it rejects (by raising) is counted as declined, and
+    a callable it returns is run once the upstream call finishes.
+    """
+
+    def __init__(self, reuse_seconds=30.0, max_results=1024):
+        self.reuse_seconds = reuse_seconds
+        self.max_results = max_results
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._results = OrderedDict()
+        self._counters = {'upstream': 0, 'collapsed': 0, 'reused': 0, 'errors': 0, 'declined': 0}
+
+    def do(self, key, fn, admit=None):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and now - cached[0] < self.reuse_seconds:
+                self._counters['reused'] += 1
+                return cached[1]
+            call = self._in_flight.get(key)
+            leader = call is None
+            release = None
+            if leader:
+                if admit is not None:
+                    try:
+                        release = admit()
+                    except Exception:
+                        self._counters['declined'] += 1
+                        raise
+                call = self._in_flight[key] = _Call()
+                self._counters['upstream'] += 1
+            else:
+                self._counters['collapsed'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            if release is not None:
+                release()
+            with self._lock:
+                del self._in_flight[key]
+                if call.error is None:
+                    self._results[key] = (time.monotonic(), call.result)
+                    self._results.move_to_end(key)
+                    while len(self._results) > self.max_results:
+                        self._results.popitem(last=False)
+                else:
+                    self._counters['errors'] += 1
+            call.done.set()
+        return call.result
+
+    def last_result(self, key):
+        """Most recent successful result for ``key`` regardless of age, or None"""
+        with self._lock:
+            cached = self._results.get(key)
+        return cached[1] if cached is not None else None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['in_flight'] = len(self._in_flight)
+        requests = stats['upstream'] + stats['collapsed'] + stats['reused']
+        stats['saved_ratio'] = (stats['collapsed'] + stats['reused']) / requests if requests else 0.0
+        return stats
+
+def request_key(provider, **request):
+    """Stable key for a provider request built from its keyword arguments"""
+    return provider + ':' + json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+
+# Shared by every LLM call path in services/
+llm_requests = SingleFlight(reuse_seconds=float(os.environ.get("LLM_RESULT_REUSE_SECONDS", 30)))
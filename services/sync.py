@@ -0,0 +1,252 @@
+import logging
+from datetime import datetime
+from sqlalchemy import and_, event, inspect, or_, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
+from models import User, Category, Expense, Budget, FinancialGoal, SyncTombstone
+from extensions import db, RoutingSession
+from services.anomaly_detector import record_expense
+from services.recurring_charges import update_recurring_for_expense
+
+SYNC_PAGE_SIZE = 500
+MAX_UPLOAD_BATCH = 500
+SYNCED_MODELS = {Expense: 'expenses', Budget: 'budgets', FinancialGoal: 'goals'}
+
+# Columns added after release (mostly for sync); tables created before they existed get them at startup
+SYNC_COLUMNS = {
+    User: ('data_revision', 'monthly_income'),
+    Expense: ('revision', 'updated_at', 'client_id'),
+    Budget: ('revision', 'updated_at'),
+    FinancialGoal: ('revision', 'updated_at'),
+}
+
+class SyncError(ValueError):
+    pass
+
+def ensure_sync_schema():
+    """Add missing sync columns and indexes to existing tables"""
+    inspector = inspect(db.engine)
+    with db.engine.begin() as conn:
+        for model, names in SYNC_COLUMNS.items():
+            table = model.__table__
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for name in names:
+                if name in existing:
+                    continue
+                column = table.c[name]
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {name} {column.type.compile(db.engine.dialect)}"
+                if not column.nullable:
+                    ddl += " NOT NULL DEFAULT 0"
+                conn.execute(text(ddl))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+def _next_revision(session, user_id):
+    # The row lock taken by this UPDATE orders concurrent writers for the same
+    # user, so a client never sees revision N before every change up to N.
+    users = User.__table__
+    conn = session.connection()
+    conn.execute(users.update().where(users.c.id == user_id).values(data_revision=users.c.data_revision + 1))
+    revision = conn.execute(select(users.c.data_revision).where(users.c.id == user_id)).scalar_one()
+    user = session.identity_map.get(inspect(User).identity_key_from_primary_key((user_id,)))
+    if user is not None:
+        set_committed_value(user, 'data_revision', revision)
+    return revision
+
+@event.listens_for(RoutingSession, "before_flush")
+def _stamp_revisions(session, flush_context, instances):
+    """Give every changed expense, budget and goal its user's next revision.
+
+    Bulk statements bypass this on purpose: archived expenses stay on clients
+    as history rather than being sent as deletions.
+    """
+    changed = {}
+    for obj in session.new:
+        if type(obj) in SYNCED_MODELS:
+            changed.setdefault(obj.user_id, []).append(obj)
+    for obj in session.dirty:
+        if type(obj) in SYNCED_MODELS and session.is_modified(obj, include_collections=False):
+            changed.setdefault(obj.user_id, []).append(obj)
+    deleted = [obj for obj in session.deleted if type(obj) in SYNCED_MODELS]
+    for obj in deleted:
+        changed.setdefault(obj.user_id, [])
+    for obj in session.dirty:
+        # Income feeds the goal forecasts, so cached dashboard fragments must be refreshed
+        if type(obj) is User and inspect(obj).attrs.monthly_income.history.has_changes():
+            changed.setdefault(obj.id, [])
+    changed.pop(None, None)
+    if not changed:
+        return
+
+    session.info["wrote"] = True  # Keep the revision bump on the primary
+    for user_id, objs in changed.items():
+        revision = _next_revision(session, user_id)
+        for obj in objs:
+            obj.revision = revision
+        for obj in deleted:
+            if obj.user_id == user_id:
+                session.add(SyncTombstone(
+                    user_id=user_id, entity=SYNCED_MODELS[type(obj)], entity_id=obj.id, revision=revision
+                ))
+
+def parse_cursor(cursor):
+    """'<revision>' or '<revision>:<last expense id>' -> (revision, last_id); None means full sync"""
+    if cursor in (None, ''):
+        return -1, None
+    revision, _, last_id = cursor.partition(':')
+    try:
+        return int(revision), int(last_id) if last_id else None
+    except ValueError:
+        raise SyncError(f"Invalid sync cursor '{cursor}'")
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+def _expense_dict(row):
+    return {
+        'id': row.id, 'amount': row.amount, 'description': row.description, 'date': _iso(row.date),
+        'category_id': row.category_id, 'client_id': row.client_id, 'updated_at': _iso(row.updated_at),
+    }
+
+def _budget_dict(budget):
+    return {
+        'id': budget.id, 'amount': budget.amount, 'notify_threshold': budget.notify_threshold,
+        'category_id': budget.category_id, 'updated_at': _iso(budget.updated_at),
+    }
+
+def _goal_dict(goal):
+    return {
+        'id': goal.id, 'name': goal.name, 'target_amount': goal.target_amount,
+        'current_amount': goal.current_amount, 'deadline': _iso(goal.deadline), 'status': goal.status,
+        'updated_at': _iso(goal.updated_at),
+    }
+
+def changes_since(user_id, cursor=None, limit=SYNC_PAGE_SIZE):
+    """Expenses, budgets, goals and deletions changed after ``cursor``.
+
+    Expenses are paged in (revision, id) order, so one page costs an index
+    range scan however large the history is; follow ``cursor`` while
+    ``has_more`` is true. A missing or unknown cursor returns everything.
+    """
+    revision, last_id = parse_cursor(cursor)
+    head = db.session.execute(select(User.data_revision).where(User.id == user_id)).scalar_one()
+    if revision > head:
+        # Cursor from a different database (e.g. restored backup): start over
+        revision, last_id = -1, None
+    full = revision < 0
+
+    after = Expense.revision > revision
+    if last_id is not None:
+        after = or_(after, and_(Expense.revision == revision, Expense.id > last_id))
+    rows = db.session.execute(
+        select(Expense.id, Expense.amount, Expense.description, Expense.date, Expense.category_id,
+               Expense.client_id, Expense.updated_at, Expense.revision)
+        .where(Expense.user_id == user_id, after, Expense.revision <= head)
+        .order_by(Expense.revision, Expense.id)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    if has_more:
+        rows = rows[:limit]
+        upto, next_cursor = rows[-1].revision, f"{rows[-1].revision}:{rows[-1].id}"
+    else:
+        upto, next_cursor = head, str(head)
+
+    budgets = Budget.query.filter(Budget.user_id == user_id, Budget.revision > revision, Budget.revision <= upto)
+    goals = FinancialGoal.query.filter(
+        FinancialGoal.user_id == user_id, FinancialGoal.revision > revision, FinancialGoal.revision <= upto
+    )
+    deleted = {entity: [] for entity in SYNCED_MODELS.values()}
+    if not full:
+        for entity, entity_id in db.session.execute(
+            select(SyncTombstone.entity, SyncTombstone.entity_id).where(
+                SyncTombstone.user_id == user_id, SyncTombstone.revision > revision, SyncTombstone.revision <= upto
+            )
+        ):
+            deleted[entity].append(entity_id)
+
+    return {
+        'cursor': next_cursor,
+        'has_more': has_more,
+        'full': full,
+        'expenses': [_expense_dict(row) for row in rows],
+        'budgets': [_budget_dict(budget) for budget in budgets],
+        'goals': [_goal_dict(goal) for goal in goals],
+        'deleted': deleted,
+    }
+
+def _parse_upload(item, category_ids, fallback_category_id):
+    client_id = str(item.get('client_id') or '').strip()
+    if not client_id or len(client_id) > 64:
+        raise SyncError("client_id is required (at most 64 characters)")
+    amount = float(item['amount'])
+    category_id = item.get('category_id')
+    category_id = int(category_id) if category_id is not None and int(category_id) in category_ids else fallback_category_id
+    date = datetime.fromisoformat(item['date']) if item.get('date') else datetime.now()
+    if date.tzinfo is not None:
+        date = date.astimezone().replace(tzinfo=None)  # Stored as naive server-local time like other expenses
+    return client_id, {'amount': amount, 'description': str(item.get('description') or '')[:256],
+                       'category_id': category_id, 'date': date}
+
+def upload_expenses(user_id, items):
+    """Create offline expenses idempotently, keyed by their client-generated ``client_id``.
+
+    Re-sending a batch (or part of it) after a lost response returns the
+    original ids with status 'duplicate' instead of creating copies.
+    """
+    if not isinstance(items, list):
+        raise SyncError("expenses must be a list")
+    if len(items) > MAX_UPLOAD_BATCH:
+        raise SyncError(f"At most {MAX_UPLOAD_BATCH} expenses per upload")
+
+    category_ids = set(db.session.scalars(select(Category.id)))
+    fallback = Category.query.filter(Category.name.ilike('%other%')).first() or Category.query.first()
+    for attempt in range(2):
+        try:
+            return _store_uploads(user_id, items, category_ids, fallback.id)
+        except IntegrityError:
+            # A concurrent upload of the same batch won the race; the retry sees its rows
+            db.session.rollback()
+            if attempt:
+                raise
+
+def _store_uploads(user_id, items, category_ids, fallback_category_id):
+    results, pending = [], {}
+    for item in items:
+        try:
+            client_id, fields = _parse_upload(item, category_ids, fallback_category_id)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            results.append({'client_id': item.get('client_id') if isinstance(item, dict) else None,
+                            'status': 'invalid', 'error': str(e)})
+            continue
+        results.append({'client_id': client_id})
+        pending.setdefault(client_id, fields)
+
+    existing = dict(db.session.execute(
+        select(Expense.client_id, Expense.id).where(Expense.user_id == user_id, Expense.client_id.in_(list(pending)))
+    ).all()) if pending else {}
+    created = {
+        client_id: Expense(user_id=user_id, client_id=client_id, **fields)
+        for client_id, fields in pending.items() if client_id not in existing
+    }
+    if created:
+        new_expenses = sorted(created.values(), key=lambda e: e.date)
+        db.session.add_all(new_expenses)
+        db.session.flush()
+        for expense in new_expenses:
+            record_expense(expense)
+            update_recurring_for_expense(expense)
+        db.session.commit()
+        logging.info(f"Synced {len(created)} offline expenses for user {user_id}")
+
+    seen = set()
+    for result in results:
+        client_id = result['client_id']
+        if result.get('status') == 'invalid':
+            continue
+        if client_id in created and client_id not in seen:
+            result.update(status='created', id=created[client_id].id)
+        else:
+            result.update(status='duplicate', id=existing.get(client_id) or created[client_id].id)
+        seen.add(client_id)
+    return results
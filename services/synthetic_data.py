@@ -0,0 +1,99 @@
+import logging
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+from models import User, Category, Expense, Budget, FinancialGoal
+from extensions import db
+from services.anomaly_detector import backfill_spending_state
+from services.recurring_charges import detect_recurring_charges
+
+SYNTHETIC_PASSWORD = 'synthetic'
+INSERT_CHUNK = 10000
+
+# (merchants, typical amount) by the first word of the category name
+SPENDING_PROFILES = {
+    'food': (['Campus Dining', 'Trader Joes', 'Chipotle', 'Starbucks', 'Pizza Hut', 'Whole Foods'], 14.0),
+    'transportation': (['Uber', 'Metro Card', 'Lyft', 'Shell Gas'], 12.0),
+    'education': (['Campus Bookstore', 'Chegg', 'Coursera', 'Office Depot'], 35.0),
+    'entertainment': (['AMC Theatres', 'Steam', 'Bowling Night', 'Concert Tickets'], 20.0),
+    'utilities': (['Verizon Wireless', 'Comcast Internet', 'PG&E'], 45.0),
+}
+SUBSCRIPTIONS = [
+    ('Netflix', 15.49, 'entertainment'),
+    ('Spotify Premium', 10.99, 'entertainment'),
+    ('Verizon Wireless', 45.00, 'utilities'),
+]
+
+def _category_word(name):
+    words = ''.join(ch if ch.isalpha() or ch.isspace() else ' ' for ch in name.lower()).split()
+    return words[0] if words else ''
+
+def seed_synthetic_data(users=3, months=18, per_month=60, seed=0):
+    """Create 'synthetic-N' users with months of realistic expenses, budgets and goals.
+
+    Users that already exist are left untouched, so the command can be re-run.
+    Returns the ids of all synthetic users requested.
+    """
+    rng = np.random.default_rng(seed)
+    categories = {_category_word(c.name): c for c in Category.query.all()}
+    profiles = {word: profile for word, profile in SPENDING_PROFILES.items() if word in categories}
+    if not profiles:
+        raise ValueError("No matching categories; start the app once to create the defaults")
+    words = list(profiles)
+    now = datetime.now().replace(microsecond=0)
+
+    user_ids = []
+    for n in range(1, users + 1):
+        username = f"synthetic-{n}"
+        user = User.query.filter_by(username=username).first()
+        if user is not None:
+            user_ids.append(user.id)
+            continue
+        user = User(username=username, email=f"{username}@example.com",
+                    password_hash=generate_password_hash(SYNTHETIC_PASSWORD))
+        db.session.add(user)
+        db.session.flush()
+
+        count = months * per_month
+        picks = rng.integers(len(words), size=count)
+        offsets = rng.uniform(0, months * 30.44, size=count)
+        rows = []
+        for pick, offset, noise in zip(picks, offsets, rng.lognormal(0, 0.5, size=count)):
+            merchants, typical = profiles[words[pick]]
+            rows.append({
+                'amount': round(float(typical * noise), 2),
+                'description': merchants[rng.integers(len(merchants))],
+                'date': now - timedelta(days=float(offset)),
+                'user_id': user.id,
+                'category_id': categories[words[pick]].id,
+            })
+        for description, amount, word in SUBSCRIPTIONS:
+            if word in categories:
+                day = int(rng.integers(1, 28))
+                for month in range(months):
+                    rows.append({'amount': amount, 'description': description,
+                                 'date': now - timedelta(days=month * 30.44 + day), 'user_id': user.id,
+                                 'category_id': categories[word].id})
+        if 'income' in categories:
+            for month in range(months):
+                rows.append({'amount': 1800.0, 'description': 'Campus job payroll',
+                             'date': now - timedelta(days=month * 30.44 + 1), 'user_id': user.id,
+                             'category_id': categories['income'].id})
+        for start in range(0, len(rows), INSERT_CHUNK):
+            db.session.execute(insert(Expense), rows[start:start + INSERT_CHUNK])
+
+        for word, (_, typical) in profiles.items():
+            db.session.add(Budget(amount=round(typical * per_month / len(profiles) * 1.1, 2),
+                                  category_id=categories[word].id, user_id=user.id, notify_threshold=90.0))
+        db.session.add(FinancialGoal(name='Emergency fund', target_amount=3000.0, current_amount=450.0,
+                                     deadline=now + timedelta(days=365), user_id=user.id))
+        db.session.add(FinancialGoal(name='New laptop', target_amount=1400.0, current_amount=300.0,
+                                     deadline=now + timedelta(days=150), user_id=user.id))
+        db.session.commit()
+        user_ids.append(user.id)
+        logging.info(f"Seeded {len(rows)} expenses for {username}")
+
+        backfill_spending_state(user.id)
+        detect_recurring_charges(user.id)
+    return user_ids
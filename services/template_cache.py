@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import g, has_app_context
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from sqlalchemy import select
+from models import User
+from extensions import db
+
+# Fragments are keyed by data revision, so the TTL only bounds staleness from
+# things that do not bump it (batch jobs, the passage of time).
+FRAGMENT_CACHE_TTL = int(os.environ.get("FRAGMENT_CACHE_TTL", 600))
+FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get("FRAGMENT_CACHE_MAX_ENTRIES", 5000))
+
+class MemoryFragmentStore:
+    """Per-process LRU of rendered fragments"""
+
+    def __init__(self, max_entries=FRAGMENT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class RedisFragmentStore:
+    """Fragments shared by all workers through Redis (needs the redis package)"""
+
+    def __init__(self, url, prefix='cashai:fragment:'):
+        import redis
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._redis.get(self.prefix + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value, ttl):
+        self._redis.setex(self.prefix + key, ttl, value)
+
+class FragmentCacheExtension(Extension):
+    """``{% cache 'name', key, ... %}...{% endcache %}`` stores the rendered block.
+
+    Include everything the block depends on in the key, typically
+    ``current_user.id, current_user.data_revision``. Lazy queries passed to the
+    template are then never executed on a hit.
+    """
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None, fragment_cache_ttl=FRAGMENT_CACHE_TTL)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key_parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render_cached', [nodes.List(key_parts)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render_cached(self, key_parts, caller):
+        store = self.environment.fragment_cache
+        if store is None:
+            return caller()
+        key = ':'.join(str(part) for part in key_parts)
+        try:
+            cached = store.get(key)
+        except Exception:
+            cached = None  # A cache outage only costs a render
+        if cached is not None:
+            return Markup(cached)
+        rendered = caller()
+        try:
+            store.set(key, str(rendered), self.environment.fragment_cache_ttl)
+        except Exception:
+            pass
+        return rendered
+
+def data_revision(user_id):
+    """The user's data revision as seen by the current session's reads.
+
+    Inside ``replica_reads()`` this comes from the replica, like the data a
+    fragment renders, so a lagging replica never fills a newer key with older
+    data. Memoized per request because a page has several fragments.
+    """
+    revisions = g.setdefault('_data_revisions', {}) if has_app_context() else {}
+    if user_id not in revisions:
+        revisions[user_id] = db.session.execute(select(User.data_revision).where(User.id == user_id)).scalar()
+    return revisions[user_id]
+
+def init_template_caching(app):
+    """Enable fragment caching and a persistent bytecode cache, then precompile templates.
+
+    With gunicorn's preload_app the compiled templates are inherited by every
+    worker; otherwise each worker loads bytecode from disk instead of parsing.
+    """
+    directory = os.environ.get("JINJA_BYTECODE_CACHE_DIR") or os.path.join(app.instance_path, 'jinja-bytecode')
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.globals['data_revision'] = data_revision
+    url = os.environ.get("FRAGMENT_CACHE_REDIS_URL")
+    app.jinja_env.fragment_cache = RedisFragmentStore(url) if url else MemoryFragmentStore()
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
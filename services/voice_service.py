@@ -6,23 +6,15 @@ import numpy as np
 import sounddevice as sd
 import wave
 from tempfile import NamedTemporaryFile
-from services.ai_service import analyze_spending_patterns, generate_saving_tip, analyze_expense_cause
+from services.intent_router import router as intent_router
 import logging
-import re
-
-class Expense: # Placeholder class
-    def __init__(self, amount, category_id, user_id):
-        self.amount = amount
-        self.category_id = category_id
-        self.user_id = user_id
-
-def get_category_id(category): # Placeholder function
-    # Replace with actual database query to get category ID
-    category_map = {"food": 1, "transport": 2, "education": 3, "entertainment": 4, "utilities": 5}
-    return category_map.get(category)
 
 class VoiceAssistant:
     def __init__(self):
+        self.reinitialize()
+
+    def reinitialize(self):
+        """(Re)create the recognizer and TTS engine, e.g. in a freshly forked worker"""
         self.recognizer = sr.Recognizer()
         self.engine = pyttsx3.init()
         self.engine.setProperty('rate', 150)
@@ -55,35 +47,10 @@ class VoiceAssistant:
             return f"Error processing audio: {str(e)}"
 
     def generate_response(self, text, user):
-        """Enhanced voice command processing with natural language understanding"""
-        text = text.lower()
-
-        # Command patterns
-        if "add expense" in text:
-            # Extract amount and category using regex
-            amount_match = re.search(r'\d+(\.\d{1,2})?', text)
-            amount = float(amount_match.group()) if amount_match else None
-
-            categories = ["food", "transport", "education", "entertainment", "utilities"]
-            category = next((cat for cat in categories if cat in text), None)
-
-            if amount and category:
-                # Add expense through voice - Placeholder
-                expense = Expense(amount=amount, category_id=get_category_id(category), user_id=user.id) # Placeholder
-                #db.session.add(expense) # Placeholder database interaction
-                #db.session.commit() # Placeholder database interaction
-                return f"Added ${amount} expense for {category}"
-
-        elif "budget summary" in text:
-            # Placeholder for fetching expenses
-            user_expenses = user.expenses if hasattr(user, 'expenses') else [] # Placeholder for user object
-            total_spent = sum(e.amount for e in user_expenses)
-            return f"Your total spending is ${total_spent:.2f}. Would you like a detailed breakdown?"
-
-        elif "financial advice" in text:
-            return analyze_spending_patterns(user)
-
-        return "I'm sorry, I didn't understand that command. Try saying 'add expense', 'budget summary', or 'financial advice'"
+        """Answer a voice command through the intent router shared with chat"""
+        return intent_router.dispatch(text, user, default=lambda match, user: (
+            "I'm sorry, I didn't understand that command. Try saying 'add expense', 'budget summary', or 'financial advice'"
+        ))
 
 
     def _clean_response(self, text):
@@ -102,8 +102,8 @@ document.addEventListener('DOMContentLoaded', function() {
                             progressBar.classList.add('bg-success');
                         }
 
-                        // Refresh the page to update all information
-                        location.reload();
+                        // Pull just the changed rows instead of reloading the whole dashboard
+                        CashSync.pull().catch(error => console.error('Sync error:', error));
                     }
                 })
                 .catch(error => {
@@ -113,4 +113,25 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         });
     });
-});
\ No newline at end of file
+});
+
+// Apply synced goal changes to the cards already on the page
+document.addEventListener('cashai:sync', event => {
+    event.detail.goals.forEach(goal => {
+        const goalCard = document.querySelector(`[data-goal-card="${goal.id}"]`);
+        if (!goalCard) return;
+
+        const progress = Math.round(goal.current_amount / goal.target_amount * 100);
+        const progressBar = goalCard.querySelector('.progress-bar');
+        progressBar.style.width = progress + '%';
+        progressBar.setAttribute('aria-valuenow', progress);
+        progressBar.textContent = progress + '%';
+        progressBar.classList.remove('bg-primary', 'bg-info', 'bg-success');
+        progressBar.classList.add(progress >= 100 ? 'bg-success' : progress >= 75 ? 'bg-info' : 'bg-primary');
+        goalCard.querySelector('.goal-current').textContent = `Current: $${goal.current_amount.toFixed(2)}`;
+    });
+    event.detail.deleted.goals.forEach(goalId => {
+        const goalCard = document.querySelector(`[data-goal-card="${goalId}"]`);
+        if (goalCard) goalCard.closest('.col-md-4').remove();
+    });
+});
@@ -0,0 +1,65 @@
+// Delta sync: pull only what changed since the page was rendered, and upload
+// expenses recorded while offline once the connection is back.
+const CashSync = (() => {
+    const QUEUE_KEY = 'cashai-pending-expenses';
+    const UPLOAD_BATCH = 500;
+    let cursor = null;
+
+    function readQueue() {
+        return JSON.parse(localStorage.getItem(QUEUE_KEY) || '[]');
+    }
+
+    async function pull() {
+        let hasMore = true;
+        while (hasMore) {
+            const url = cursor === null ? '/api/sync' : `/api/sync?cursor=${encodeURIComponent(cursor)}`;
+            const response = await fetch(url);
+            if (!response.ok) throw new Error(`Sync failed with status ${response.status}`);
+            const changes = await response.json();
+            cursor = changes.cursor;
+            hasMore = changes.has_more;
+            document.dispatchEvent(new CustomEvent('cashai:sync', { detail: changes }));
+        }
+    }
+
+    function queueExpense(expense) {
+        const queue = readQueue();
+        queue.push({ client_id: crypto.randomUUID(), date: new Date().toISOString(), ...expense });
+        localStorage.setItem(QUEUE_KEY, JSON.stringify(queue));
+        if (navigator.onLine) flushQueue();
+    }
+
+    async function flushQueue() {
+        let queue = readQueue();
+        while (queue.length) {
+            const batch = queue.slice(0, UPLOAD_BATCH);
+            const response = await fetch('/api/sync/expenses', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ expenses: batch })
+            });
+            if (!response.ok) return;  // Keep the queue and retry on the next 'online' event
+            const data = await response.json();
+            data.results
+                .filter(result => result.status === 'invalid')
+                .forEach(result => console.warn('Dropped offline expense:', result.error));
+            // Uploads are idempotent, so the batch can go even if another tab sent it too
+            queue = readQueue().filter(item => !batch.some(sent => sent.client_id === item.client_id));
+            localStorage.setItem(QUEUE_KEY, JSON.stringify(queue));
+        }
+        await pull();
+    }
+
+    function init(initialCursor) {
+        cursor = initialCursor;
+        window.addEventListener('online', flushQueue);
+        if (navigator.onLine) flushQueue();
+    }
+
+    return { init, pull, queueExpense, flushQueue };
+})();
+
+document.addEventListener('DOMContentLoaded', () => {
+    const root = document.querySelector('[data-sync-cursor]');
+    if (root) CashSync.init(root.dataset.syncCursor);
+});